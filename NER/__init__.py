@@ -1,2 +1,16 @@
 from NER.markup import *
-from NER.text_markup import *
\ No newline at end of file
+from NER.compact_markup import *
+from NER.markup_store import *
+from NER.markup_index import *
+from NER.section_index import *
+from NER.template_filler import *
+from NER.markup_cache import *
+from NER.markup_tracer import *
+from NER.onnx_backend import *
+from NER.workers import *
+from NER.sector_chunker import *
+from NER.passage_index import *
+from NER.text_markup import *
+from NER.editable_markup import *
+from NER.markup_service import *
+from NER.worker_pool import *
\ No newline at end of file
@@ -0,0 +1,165 @@
+from array import array
+from NER.mark_up_block import *
+from typing import List, Dict, Any, Iterator
+
+_EXACT = 0  # The text of the block is the slice of the source
+_STRIPPED = 1  # The text of the block is the stripped slice of the source
+_OWN = 2  # The text of the block differs from the source and is kept apart
+
+
+def _get_kind(source: str, start: int, end: int, text: str = None) -> int:
+    """
+    :return: How the text of the block is taken from the source: _EXACT, _STRIPPED or _OWN
+    """
+    if text is None:
+        return _EXACT
+    piece = source[start: end]
+    if text == piece:
+        return _EXACT
+    return _STRIPPED if text == piece.strip() else _OWN
+
+
+class CompactMarkUp:
+    """
+    :ru Разметка текста, хранящая блоки в параллельных массивах вместо отдельных объектов MarkUpBlock.
+    :en Markup of one text, that keeps the blocks in parallel arrays instead of separate MarkUpBlock objects.
+
+    The text of a block is taken from the source string when it is asked for, only the texts that differ from
+    the source and the non-empty attachments are kept apart. Indexing gives a new MarkUpBlock, so changes of it
+    are not written back.
+    """
+
+    def __init__(self, source: str) -> None:
+        self._source = source
+        self._starts = array("i")
+        self._ends = array("i")
+        self._types = array("B")
+        self._kinds = array("B")
+        self._texts = {}
+        self._attachments = {}
+
+    @classmethod
+    def from_blocks(cls, text_markup: List[MarkUpBlock], source: str) -> 'CompactMarkUp':
+        """
+        :param text_markup: Markup of the source
+        :param source: The text witch was marked up
+        :return: CompactMarkUp
+        """
+        markup = cls(source=source)
+        for block in text_markup:
+            markup.append(block_type=block.block_type, start=block.start, end=block.end,
+                          text=block.text, attachments=block.attachments)
+        return markup
+
+    @classmethod
+    def from_arrays(cls,
+                    source: str,
+                    starts: array,
+                    ends: array,
+                    types: array,
+                    kinds: array,
+                    texts: Dict[int, str] = None,
+                    attachments: Dict[int, Dict[str, Any]] = None) -> 'CompactMarkUp':
+        """
+        This method takes the columns of the markup as they are, for example from MarkUpStore.
+        :param source: The text witch was marked up
+        :param starts: Starts of the blocks, array('i')
+        :param ends: Ends of the blocks, array('i')
+        :param types: Codes of the block types, array('B')
+        :param kinds: How the texts of the blocks are taken from the source, array('B')
+        :param texts: The own texts of the blocks by their indexes
+        :param attachments: The non-empty attachments of the blocks by their indexes
+        :return: CompactMarkUp
+        """
+        if not len(starts) == len(ends) == len(types) == len(kinds):
+            raise ValueError(f"The columns of the markup should have the same length")
+        markup = cls(source=source)
+        markup._starts, markup._ends, markup._types, markup._kinds = starts, ends, types, kinds
+        markup._texts = texts if texts is not None else {}
+        markup._attachments = attachments if attachments is not None else {}
+        return markup
+
+    @property
+    def source(self) -> str:
+        return self._source
+
+    @property
+    def starts(self) -> array:
+        return self._starts
+
+    @property
+    def ends(self) -> array:
+        return self._ends
+
+    @property
+    def types(self) -> array:
+        """
+        Codes of the block types, see MarkUpType.code.
+        """
+        return self._types
+
+    def append(self,
+               block_type: MarkUpType,
+               start: int,
+               end: int,
+               text: str = None,
+               attachments: Dict[str, Any] = None) -> None:
+        """
+        :param block_type: Type of the block
+        :param start: Start of the block in the source
+        :param end: End of the block in the source
+        :param text: Text of the block, by default the slice of the source
+        :param attachments: Facts of the block
+        """
+        index = len(self._starts)
+        kind = _get_kind(source=self._source, start=start, end=end, text=text)
+        if kind == _OWN:
+            self._texts[index] = text
+        self._starts.append(start)
+        self._ends.append(end)
+        self._types.append(block_type.code)
+        self._kinds.append(kind)
+        if attachments:
+            self._attachments[index] = attachments
+
+    def block_type(self, index: int) -> MarkUpType:
+        return MarkUpType.from_code(self._types[index])
+
+    def text(self, index: int) -> str:
+        index = self._index(index)
+        kind = self._kinds[index]
+        if kind == _OWN:
+            return self._texts[index]
+        piece = self._source[self._starts[index]: self._ends[index]]
+        return piece.strip() if kind == _STRIPPED else piece
+
+    def attachments(self, index: int) -> Dict[str, Any]:
+        return self._attachments.get(self._index(index), {})
+
+    def to_blocks(self) -> List[MarkUpBlock]:
+        return list(self)
+
+    def to_json(self) -> List[Dict[str, Any]]:
+        return [block.to_json() for block in self]
+
+    def _index(self, index: int) -> int:
+        if index < 0:
+            index += len(self._starts)
+        if not 0 <= index < len(self._starts):
+            raise IndexError(f"Markup index out of range")
+        return index
+
+    def __len__(self) -> int:
+        return len(self._starts)
+
+    def __getitem__(self, index: int) -> MarkUpBlock:
+        index = self._index(index)
+        return MarkUpBlock(text=self.text(index),
+                           block_type=self.block_type(index),
+                           start=self._starts[index],
+                           end=self._ends[index],
+                           attachments=self.attachments(index))
+
+    def __iter__(self) -> Iterator[MarkUpBlock]:
+        for index in range(len(self._starts)):
+            yield self[index]
@@ -0,0 +1,262 @@
+from NER.text_markup import *
+from NER.text_markup import _REQUISITE_TYPES
+from typing import List, Tuple, Callable
+
+
+class EditableMarkUp:
+    """
+    :ru Разметка текста, которая обновляется при правке текста без повторной разметки всего текста.
+    :en Markup of a text that is updated when the text is edited, without marking up the whole text again.
+
+    The named entities of every sector and the last markup are kept, after an edit only the sectors that touch
+    the changed place are cut again and sent to the model, the sectors after it are shifted. The markup is built
+    again only from the blocks between the nearest named entities around these sectors and is put in place of
+    the old markup of that piece, the blocks after it are shifted: the piece is cut only before a named entity
+    that the block before it does not reach, so the joins and the requisites on both sides of the cut do not meet
+    and the markup of the rest of the text stays the same. The requisites are searched again only in the unmarked blocks whose text has changed.
+    The sectors after an edit keep their old borders and the context of the changed sectors is taken only from
+    the changed place, so at the borders the markup may differ from the one get_markup gives for the new text.
+    Without the model the text is one unmarked block and every edit searches the requisites in the whole text.
+    """
+
+    def __init__(self, text_markup: TextMarkUp, text: str, border: int = None) -> None:
+        """
+        :param text_markup: The marker witch marks up the text
+        :param text: The first version of the text
+        :param border: Count of tokens in one sector, by default the one of the chunker of the marker
+        """
+        self._text_markup = text_markup
+        self._border = border
+        self._text = text
+        self._spans = []
+        self._sectors = []
+        self._requisites = {}
+        if text_markup.is_bert:
+            windows = text_markup._get_sector_windows(text=text, border=border)
+            self._spans = [(start, end) for start, end, _, _ in windows]
+            self._sectors = self._get_sectors(text=text, windows=windows)
+        self._markup = self._get_markup(text_markup=[block for index in range(len(self._sectors))
+                                                     for block in self._get_sector_blocks(index=index)])
+
+    @property
+    def text(self) -> str:
+        return self._text
+
+    @property
+    def markup(self) -> List[MarkUpBlock]:
+        return self._markup
+
+    def edit(self, start: int, end: int, replacement: str) -> List[MarkUpBlock]:
+        """
+        This method replaces the [start, end) piece of the text and gives the markup of the new text.
+        :param start: Start of the replaced piece
+        :param end: End of the replaced piece
+        :param replacement: The new text of the piece
+        :return: List[MarkUpBlock]
+        """
+        if not 0 <= start <= end <= len(self._text):
+            raise ValueError(f"Edit [{start}, {end}) is out of the text of length {len(self._text)}")
+        return self.update(text=f"{self._text[:start]}{replacement}{self._text[end:]}")
+
+    def update(self, text: str) -> List[MarkUpBlock]:
+        """
+        This method finds the changed place of the new version of the text and gives the markup of the new text.
+        :param text: The new version of the text
+        :return: List[MarkUpBlock]
+        """
+        if text == self._text:
+            return self._markup
+        if self._text_markup.is_bert:
+            region_start, region_end, delta = self._update_sectors(text=text)
+            self._text = text
+            self._markup = self._splice_markup(region_start=region_start, region_end=region_end, delta=delta)
+        else:
+            self._text = text
+            self._markup = self._get_markup(text_markup=None)
+        return self._markup
+
+    def _update_sectors(self, text: str) -> Tuple[int, int, int]:
+        """
+        This method marks up again the sectors that touch the changed place and shifts the sectors after it.
+        A sector touches the place when it has a token that ends at the start of the place or later and starts at
+        the end of the place or earlier, so a word changed at its edge is marked up again too.
+        :return: The [start, end) place of the sectors marked up again in the old text and the change of the length
+        """
+        prefix, stop = EditableMarkUp._get_changed_place(old_text=self._text, new_text=text)
+        delta = len(text) - len(self._text)
+        first = next((index for index, (_, end) in enumerate(self._spans) if end >= prefix), len(self._spans) - 1)
+        last = max(index for index, (start, _) in enumerate(self._spans) if start <= stop or index == 0)
+        last = max(first, last)
+        region_start = self._spans[first][0]
+        region_end = self._spans[last][1] if last < len(self._spans) - 1 else len(self._text)
+        region = text[region_start: region_end + delta]
+        windows = [tuple(region_start + position for position in window)
+                   for window in self._text_markup._get_sector_windows(text=region, border=self._border)]
+        spans = [(start, end) for start, end, _, _ in windows]
+        tail_spans = [(start + delta, end + delta) for start, end in self._spans[last + 1:]]
+        self._spans = self._spans[:first] + spans + tail_spans
+        self._sectors = self._sectors[:first] + self._get_sectors(text=text, windows=windows) + self._sectors[last + 1:]
+        return region_start, region_end, delta
+
+    def _splice_markup(self, region_start: int, region_end: int, delta: int) -> List[MarkUpBlock]:
+        """
+        This method builds the markup of the piece of the text from the named entity before the sectors marked up
+        again to the first named entity after them, and puts it in place of the old markup of the piece.
+        :param region_start: Start of the sectors marked up again
+        :param region_end: End of the sectors marked up again in the old text
+        :param delta: Change of the length of the text
+        :return: List[MarkUpBlock]
+        """
+        markup = self._markup
+        first = EditableMarkUp._find_block(text_markup=markup, position=region_start) - 1
+        while first > 0 and not EditableMarkUp._is_cut(text_markup=markup, index=first):
+            first -= 1
+        first = max(first, 0)
+        last = EditableMarkUp._find_block(text_markup=markup, position=region_end + 1)
+        while last < len(markup) and not EditableMarkUp._is_cut(text_markup=markup, index=last):
+            last += 1
+        piece_start = markup[first].start if first > 0 else 0
+        while True:
+            piece_end = markup[last].start + delta if last < len(markup) else len(self._text)
+            piece = self._get_markup(text_markup=[
+                block for index in range(self._find_sector(position=piece_start),
+                                         min(self._find_sector(position=piece_end - 1) + 1, len(self._spans)))
+                for block in self._get_sector_blocks(index=index) if piece_start <= block.start < piece_end])
+            # the joins of the piece and of the old markup after it must not meet, else the piece is taken longer
+            if last == len(markup) or len(piece) == 0 or \
+                    piece[-1].end <= piece_end and piece[-1].block_type != markup[last].block_type:
+                break
+            last += 1
+            while last < len(markup) and not EditableMarkUp._is_cut(text_markup=markup, index=last):
+                last += 1
+        return markup[:first] + piece + [
+            MarkUpBlock(text=block.text, block_type=block.block_type, start=block.start + delta, end=block.end + delta,
+                        attachments=dict(block.attachments)) if delta != 0 else block for block in markup[last:]]
+
+    def _find_sector(self, position: int) -> int:
+        """
+        :return: The index of the first sector that ends after the position, the count of sectors when there is none
+        """
+        low, high = 0, len(self._spans)
+        while low < high:
+            middle = (low + high) // 2
+            if self._spans[middle][1] <= position:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _get_sectors(self, text: str, windows: List[Tuple[int, int, int, int]]) -> List[List[MarkUpBlock]]:
+        """
+        This method marks up the sectors, the blocks of every sector are kept with offsets from the start of
+        the sector, so the sectors after an edit are shifted only by their spans.
+        """
+        sectors = [[] for _ in range(len(windows))]
+        for index, sector_markup in self._text_markup._get_sectors_markup(sectors=[
+                (index, text[context_start: context_end], context_start, (start, end))
+                for index, (start, end, context_start, context_end) in enumerate(windows)]):
+            start = windows[index][0]
+            sectors[index] = [MarkUpBlock(text=block.text, block_type=block.block_type, start=block.start - start,
+                                          end=block.end - start, attachments=block.attachments)
+                              for block in sector_markup]
+        return sectors
+
+    def _get_sector_blocks(self, index: int) -> List[MarkUpBlock]:
+        """
+        :return: The blocks of the sector with offsets in the text
+        """
+        start = self._spans[index][0]
+        return [MarkUpBlock(text=block.text, block_type=block.block_type, start=block.start + start,
+                            end=block.end + start, attachments=block.attachments) for block in self._sectors[index]]
+
+    def _get_markup(self, text_markup: List[MarkUpBlock] or None) -> List[MarkUpBlock]:
+        """
+        This method joins the blocks of the sectors and places the requisites like get_markup does, the requisites of
+        the unmarked blocks are taken from the last markup when the text of the block is the same.
+        :param text_markup: The blocks of the sectors, None without the model
+        """
+        tracer = self._text_markup.tracer
+        if self._text_markup.is_bert:
+            with tracer.stage("rebuild_markup:bert", blocks_in=len(text_markup)) as record:
+                text_markup = TextMarkUp.rebuild_markup(text_markup=text_markup, delete_empty=True, join_similar=True)
+                record.blocks_out = len(text_markup)
+        else:
+            text_markup = [MarkUpBlock(text=self._text, block_type=MarkUpType.NOTHING, start=0, end=len(self._text))]
+        requisites = {}
+        result_markup = []
+        with tracer.stage("requisites") as record:
+            for block in text_markup:
+                if block.block_type != MarkUpType.NOTHING:
+                    result_markup.append(block)
+                    continue
+                key = (block.text, block.end - block.start)
+                if key not in requisites:
+                    requisites[key] = self._requisites.get(key)
+                if requisites[key] is None:
+                    record.blocks_in += 1
+                    requisites[key] = TextMarkUp.get_requisites_markup(
+                        text_markup=[MarkUpBlock(text=block.text, block_type=MarkUpType.NOTHING, start=0,
+                                                 end=block.end - block.start)])
+                    record.blocks_out += len(requisites[key])
+                    record.count_matches(text_markup=requisites[key], block_types=_REQUISITE_TYPES.values())
+                result_markup += [MarkUpBlock(text=piece.text, block_type=piece.block_type,
+                                              start=block.start + piece.start, end=block.start + piece.end,
+                                              attachments=dict(piece.attachments))
+                                  for piece in requisites[key]]
+        self._requisites = requisites
+        with tracer.stage("rebuild_markup:final", blocks_in=len(result_markup)) as record:
+            result_markup = TextMarkUp.rebuild_markup(text_markup=result_markup, delete_empty=True, join_similar=True)
+            record.blocks_out = len(result_markup)
+        return result_markup
+
+    @staticmethod
+    def _is_cut(text_markup: List[MarkUpBlock], index: int) -> bool:
+        """
+        :return: Whether the markup can be cut before the block: the block is a named entity, the block before it
+        is of other type and ends before it starts, so the joins on both sides of the cut do not meet
+        """
+        block, previous = text_markup[index], text_markup[index - 1]
+        return block.block_type != MarkUpType.NOTHING and block.block_type not in _REQUISITE_TYPES.values() and \
+            previous.block_type != block.block_type and previous.end <= block.start
+
+    @staticmethod
+    def _find_block(text_markup: List[MarkUpBlock], position: int) -> int:
+        """
+        :return: The index of the first block that starts at the position or later
+        """
+        low, high = 0, len(text_markup)
+        while low < high:
+            middle = (low + high) // 2
+            if text_markup[middle].start < position:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    @staticmethod
+    def _get_changed_place(old_text: str, new_text: str) -> Tuple[int, int]:
+        """
+        This method gives the [start, stop) place of the old text that differs from the new text, the text before
+        and after the place is the same in both versions.
+        """
+        limit = min(len(old_text), len(new_text))
+        prefix = EditableMarkUp._common_length(limit=limit, same=lambda length: old_text[:length] == new_text[:length])
+        suffix = EditableMarkUp._common_length(limit=limit - prefix,
+                                               same=lambda length: old_text[len(old_text) - length:] ==
+                                               new_text[len(new_text) - length:])
+        return prefix, len(old_text) - suffix
+
+    @staticmethod
+    def _common_length(limit: int, same: Callable[[int], bool]) -> int:
+        """
+        This method finds the greatest length up to the limit, for witch the pieces of both texts are the same,
+        by bisection, so the pieces are compared by whole slices instead of a loop over the chars.
+        """
+        low, high = 0, limit
+        while low < high:
+            middle = (low + high + 1) // 2
+            if same(middle):
+                low = middle
+            else:
+                high = middle - 1
+        return low
@@ -4,17 +4,19 @@ from typing import List, Dict, Any
 
 
 class MarkUpBlock:
+    __slots__ = ("_text", "_block_type", "_start", "_end", "_attachments")
+
     def __init__(self,
                  text: str,
                  block_type: MarkUpType,
                  start: int = 0,
                  end: int = 0,
-                 attachments: Dict[str, Any] = {}):
+                 attachments: Dict[str, Any] = None):
         self._text = text
         self._block_type = block_type
         self._start = start
         self._end = end
-        self._attachments = attachments
+        self._attachments = attachments if attachments is not None else {}
 
     @property
     def text(self) -> str:
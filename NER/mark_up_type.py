@@ -32,4 +32,19 @@ class MarkUpType(Enum):
     EMAIL = "EMAIL"
     URL = "URL"
     NOTHING = "O"
-    NONE = None
\ No newline at end of file
+    NONE = None
+
+    @property
+    def code(self) -> int:
+        """
+        Small integer code of the type, used to keep markup in compact arrays.
+        """
+        return _CODES[self]
+
+    @staticmethod
+    def from_code(code: int) -> 'MarkUpType':
+        return _TYPES[code]
+
+
+_TYPES = list(MarkUpType)
+_CODES = {block_type: code for code, block_type in enumerate(_TYPES)}
@@ -0,0 +1,170 @@
+import json
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from NER.mark_up_block import *
+from typing import List, Dict, Tuple
+
+
+class MarkUpCache:
+    """
+    :ru Кэш разметки секторов текста с вытеснением давно не использованных записей и хранением на диске.
+    :en A cache of the markup of text sectors with eviction of the least recently used entries and storage on disk.
+
+    The key is the hash of the model name with its backend and the text of the sector, the markup is kept with offsets
+    from the start of the sector and is shifted to the place of the sector when it is taken. The disk store is a sqlite
+    file, it is used when the path is given and keeps every entry, also evicted from the memory. The new entries are
+    committed to the disk by 'commit_every' at once and by flush or close.
+
+    The cache may be used from several threads, for example by the threads of MarkUpService, every call holds a lock.
+    """
+
+    def __init__(self, max_size: int = 4096, path: str = None, commit_every: int = 64) -> None:
+        """
+        :param max_size: The greatest count of entries in the memory
+        :param path: Path of the sqlite file, the entries are kept only in the memory when it is not given
+        :param commit_every: Count of the new entries that are committed to the disk at once
+        """
+        if max_size <= 0:
+            raise ValueError(f"Max size should be grater then zero")
+        if commit_every <= 0:
+            raise ValueError(f"Commit every should be grater then zero")
+        self._max_size = max_size
+        self._commit_every = commit_every
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        self._pending = 0
+        self._path = path
+        self._connection = None
+        self._inherited = []
+        if path is not None:
+            self._connection = sqlite3.connect(path, check_same_thread=False)
+            self._connection.execute("CREATE TABLE IF NOT EXISTS markup (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            self._connection.commit()
+
+    @property
+    def hits(self) -> int:
+        return self._hits
+
+    @property
+    def disk_hits(self) -> int:
+        return self._disk_hits
+
+    @property
+    def misses(self) -> int:
+        return self._misses
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"size": len(self._memory),
+                    "max_size": self._max_size,
+                    "hits": self._hits,
+                    "disk_hits": self._disk_hits,
+                    "misses": self._misses}
+
+    def get(self, model: str, text: str, start_index: int = 0) -> List[MarkUpBlock] or None:
+        """
+        :param model: Name of the model witch marked up the sector with its backend, like 'ner_rus_bert:onnx-int8'
+        :param text: Text of the sector
+        :param start_index: Offset of the sector in the whole document
+        :return: The markup of the sector or None, when it is not in the cache
+        """
+        key = MarkUpCache._get_key(model=model, text=text)
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+                self._hits += 1
+            elif self._connection is not None:
+                row = self._connection.execute("SELECT value FROM markup WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    value = [tuple(block) for block in json.loads(row[0])]
+                    self._remember(key=key, value=value)
+                    self._disk_hits += 1
+            if value is None:
+                self._misses += 1
+                return None
+        return [MarkUpBlock(text=block_text, block_type=MarkUpType(block_type), start=start + start_index,
+                            end=end + start_index) for block_text, block_type, start, end in value]
+
+    def put(self, model: str, text: str, text_markup: List[MarkUpBlock], start_index: int = 0) -> None:
+        """
+        :param model: Name of the model witch marked up the sector with its backend, like 'ner_rus_bert:onnx-int8'
+        :param text: Text of the sector
+        :param text_markup: Markup of the sector
+        :param start_index: Offset of the sector in the whole document
+        """
+        key = MarkUpCache._get_key(model=model, text=text)
+        value = [(block.text, block.block_type.value, block.start - start_index, block.end - start_index)
+                 for block in text_markup]
+        with self._lock:
+            self._remember(key=key, value=value)
+            if self._connection is not None:
+                self._connection.execute("INSERT OR REPLACE INTO markup (key, value) VALUES (?, ?)",
+                                         (key, json.dumps(value, ensure_ascii=False)))
+                self._pending += 1
+                if self._pending >= self._commit_every:
+                    self._commit()
+
+    def flush(self) -> None:
+        """
+        This method commits the new entries to the disk.
+        """
+        with self._lock:
+            self._commit()
+
+    def reopen(self, commit_every: int = None) -> None:
+        """
+        This method opens the disk store again in a process forked from the owner of the cache, it should be called
+        before the cache is used there: a sqlite connection can not be used by several processes. The connection of
+        the owner is kept unused, closing it here would touch the locks of the owner. Flush the cache before the fork,
+        the new connection does not see the entries that are not committed.
+        :param commit_every: Count of the new entries that are committed at once in this process, by default the same,
+         several processes that write to one store should commit every entry, an open write blocks the others
+        """
+        if commit_every is not None:
+            if commit_every <= 0:
+                raise ValueError(f"Commit every should be grater then zero")
+            self._commit_every = commit_every
+        self._lock = threading.Lock()
+        self._pending = 0
+        if self._connection is not None:
+            self._inherited.append(self._connection)
+            self._connection = sqlite3.connect(self._path, check_same_thread=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            if self._connection is not None:
+                self._connection.execute("DELETE FROM markup")
+                self._commit()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._connection is not None:
+                self._commit()
+                self._connection.close()
+                self._connection = None
+
+    def _commit(self) -> None:
+        if self._connection is not None:
+            self._connection.commit()
+        self._pending = 0
+
+    def _remember(self, key: str, value: List[Tuple[str, str, int, int]]) -> None:
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self._max_size:
+            self._memory.popitem(last=False)
+
+    @staticmethod
+    def _get_key(model: str, text: str) -> str:
+        return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._memory)
@@ -0,0 +1,55 @@
+from bisect import bisect_left, bisect_right
+from NER.mark_up_block import *
+from typing import List, Dict, Iterable
+
+
+class MarkUpIndex:
+    """
+    :ru Индекс разметки для поиска блоков по типу и положению в тексте.
+    :en An index of the markup for searching the blocks by type and position in the text.
+
+    The blocks of every type are kept sorted by start, so a range of starts is found by bisect.
+    """
+
+    def __init__(self, text_markup: Iterable[MarkUpBlock]) -> None:
+        blocks = {}
+        for block in text_markup:
+            blocks.setdefault(block.block_type, []).append(block)
+        self._blocks = {}
+        self._starts = {}
+        for block_type, type_blocks in blocks.items():
+            type_blocks.sort(key=lambda x: x.start)
+            self._blocks[block_type] = type_blocks
+            self._starts[block_type] = [block.start for block in type_blocks]
+
+    def search(self,
+               block_type: MarkUpType or str,
+               start: int = None,
+               stop: int = None,
+               in_string: str = None) -> List[MarkUpBlock]:
+        """
+        This method gives the blocks of the type, that start within [start, stop] and contain the substring,
+         in the order of their starts.
+        :param block_type: Type of the blocks or its tag
+        :param start: The least start of the block, no limit by default
+        :param stop: The greatest start of the block, no limit by default
+        :param in_string: The substring that the text of the block should contain
+        :return: List[MarkUpBlock]
+        """
+        if not isinstance(block_type, MarkUpType):
+            block_type = MarkUpType(block_type)
+        if block_type not in self._blocks:
+            return []
+        starts = self._starts[block_type]
+        left = bisect_left(starts, start) if start is not None else 0
+        right = bisect_right(starts, stop) if stop is not None else len(starts)
+        blocks = self._blocks[block_type][left: right]
+        if in_string is not None:
+            return [block for block in blocks if in_string in block.text]
+        return blocks
+
+    def count(self) -> Dict[MarkUpType, int]:
+        return {block_type: len(blocks) for block_type, blocks in self._blocks.items()}
+
+    def __len__(self) -> int:
+        return sum(len(blocks) for blocks in self._blocks.values())
@@ -0,0 +1,387 @@
+import re
+import json
+import time
+import asyncio
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from NER.text_markup import *
+from typing import List, Dict, Any, Callable, Tuple
+
+_RE_SPACES = re.compile(r"[\n ]+")
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 500: "Internal Server Error",
+            503: "Service Unavailable"}
+_LOGGER = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    """
+    The queue of the batcher is full, the request should be repeated later.
+    """
+
+
+class MicroBatcher:
+    """
+    :ru Планировщик, собирающий поступающие элементы в пакеты по размеру и сроку перед вызовом модели.
+    :en A scheduler that collects the incoming items into batches by size and deadline before calling the model.
+
+    A batch is sent when it has 'max_batch' items or when 'max_delay' seconds passed since its first item, the function
+    runs in a thread of its own, so one batch is processed at a time and the event loop is not blocked. When the queue
+    has no room for the items of a request, they are rejected with QueueFullError, that is the backpressure for
+    the callers.
+    """
+
+    def __init__(self,
+                 function: Callable[[List[Any]], List[Any]],
+                 max_batch: int = 16,
+                 max_delay: float = 0.01,
+                 max_queue: int = 1024) -> None:
+        """
+        :param function: Takes a list of items and gives the list of their results in the same order
+        :param max_batch: The greatest count of items in one call of the function
+        :param max_delay: The longest wait for a batch to fill in seconds
+        :param max_queue: The greatest count of waiting items
+        """
+        if max_batch <= 0:
+            raise ValueError(f"Max batch should be grater then zero")
+        if max_queue <= 0:
+            raise ValueError(f"Max queue should be grater then zero")
+        self._function = function
+        self._max_batch = max_batch
+        self._max_delay = max_delay
+        self._max_queue = max_queue
+        self._queue = deque()
+        self._executor = None
+        self._task = None
+        self._ready = None
+        self._full = None
+        self._in_flight = 0
+        self._batches = 0
+        self._items = 0
+        self._rejected = 0
+        self._seconds = 0.0
+
+    async def start(self) -> None:
+        self._ready = asyncio.Event()
+        self._full = asyncio.Event()
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        while len(self._queue) > 0:
+            _, future = self._queue.popleft()
+            if not future.done():
+                future.cancel()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    async def submit(self, items: List[Any]) -> List[Any]:
+        """
+        This method puts all items in the queue at once or rejects all of them, when the queue has no room for them.
+        Items more than 'max_queue' are taken only by an empty queue.
+        :param items: The items for the function
+        :return: The results of the items
+        """
+        if self._task is None:
+            raise ValueError(f"The batcher is not started")
+        if len(self._queue) > 0 and len(self._queue) + len(items) > self._max_queue:
+            self._rejected += len(items)
+            raise QueueFullError(f"The queue has {len(self._queue)} items")
+        loop = asyncio.get_event_loop()
+        futures = [loop.create_future() for _ in range(len(items))]
+        self._queue.extend(zip(items, futures))
+        self._ready.set()
+        if len(self._queue) >= self._max_batch:
+            self._full.set()
+        return list(await asyncio.gather(*futures))
+
+    def stats(self) -> Dict[str, Any]:
+        return {"queue_depth": len(self._queue),
+                "max_queue": self._max_queue,
+                "in_flight": self._in_flight,
+                "batches": self._batches,
+                "items": self._items,
+                "rejected": self._rejected,
+                "batch_seconds": self._seconds}
+
+    async def _run(self) -> None:
+        loop = asyncio.get_event_loop()
+        while True:
+            while len(self._queue) == 0:
+                self._ready.clear()
+                await self._ready.wait()
+            if len(self._queue) < self._max_batch:
+                self._full.clear()
+                try:
+                    await asyncio.wait_for(self._full.wait(), timeout=self._max_delay)
+                except asyncio.TimeoutError:
+                    pass
+            batch = [self._queue.popleft() for _ in range(min(self._max_batch, len(self._queue)))]
+            batch = [(item, future) for item, future in batch if not future.cancelled()]
+            if len(batch) == 0:
+                continue
+            self._in_flight = len(batch)
+            started = time.perf_counter()
+            try:
+                results = await loop.run_in_executor(self._executor, self._function, [item for item, _ in batch])
+            except Exception as error:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(error)
+            else:
+                for (_, future), result in zip(batch, results):
+                    if not future.done():
+                        future.set_result(result)
+            self._seconds += time.perf_counter() - started
+            self._batches += 1
+            self._items += len(batch)
+            self._in_flight = 0
+
+
+class MarkUpService:
+    """
+    :ru Асинхронный сервис разметки текстов и ответов на вопросы для многих клиентов с одной моделью.
+    :en An asynchronous service of the markup of texts and the answers to questions for many callers with one model.
+
+    The sectors of all concurrent texts go to the NER model through one MicroBatcher, and the pairs of a text and
+    a question go to the QA model through another one. The service is served over HTTP on a TCP port or a Unix socket:
+    POST /markup {"text"}, POST /qa {"text", "question" or "questions"}, GET /metrics in the Prometheus format,
+    GET /stats in json and GET /health. A full queue gives 503 with Retry-After.
+    """
+
+    def __init__(self,
+                 text_markup: TextMarkUp,
+                 qa_model: Callable = None,
+                 max_batch: int = 16,
+                 max_delay: float = 0.01,
+                 max_queue: int = 1024,
+                 border: int = None) -> None:
+        """
+        :param text_markup: The marker, its model is called only by the service
+        :param qa_model: The QA model, it takes the lists of contexts and questions, like squad_ru_bert
+        :param max_batch: The greatest count of sectors or questions in one model call
+        :param max_delay: The longest wait for a batch to fill in seconds
+        :param max_queue: The greatest count of waiting sectors or questions of every model
+        :param border: Count of tokens in one sector, by default the one of the chunker of the marker
+        """
+        self._text_markup = text_markup
+        self._qa_model = qa_model
+        self._border = border
+        self._executor = None
+        self._server = None
+        self._sectors = MicroBatcher(function=self._mark_up_sectors, max_batch=max_batch, max_delay=max_delay,
+                                     max_queue=max_queue)
+        self._questions = MicroBatcher(function=self._answer_questions, max_batch=max_batch, max_delay=max_delay,
+                                       max_queue=max_queue)
+        self._requests = {}
+
+    async def start(self) -> None:
+        self._executor = ThreadPoolExecutor()
+        await self._sectors.start()
+        await self._questions.start()
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        await self._sectors.stop()
+        await self._questions.stop()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8080, path: str = None) -> None:
+        """
+        This method starts the service and serves it until it is cancelled.
+        :param host: Host of the TCP server
+        :param port: Port of the TCP server
+        :param path: Path of the Unix socket, used instead of the TCP server when it is given
+        """
+        await self.start()
+        try:
+            if path is not None:
+                self._server = await asyncio.start_unix_server(self._handle, path=path)
+            else:
+                self._server = await asyncio.start_server(self._handle, host=host, port=port)
+            await self._server.serve_forever()
+        finally:
+            await self.stop()
+
+    async def markup(self, text: str) -> List[MarkUpBlock]:
+        """
+        The sectors found in the cache of the marker do not wait for the model, the others are stored in it.
+        :param text: A string that needs markup
+        :return: The same markup as TextMarkUp.get_markup gives
+        """
+        loop = asyncio.get_event_loop()
+        if not self._text_markup.is_bert:
+            return await loop.run_in_executor(self._executor, self._text_markup.get_markup, text)
+        sectors, sectors_markup = await loop.run_in_executor(self._executor, self._get_cached_sectors, text)
+        missing = [index for index in range(len(sectors)) if sectors_markup[index] is None]
+        if len(missing) > 0:
+            found = await self._sectors.submit([sectors[index][:2] for index in missing])
+            for index, sector_markup in zip(missing, found):
+                sectors_markup[index] = sector_markup
+            await loop.run_in_executor(self._executor, self._put_cached_sectors, [sectors[index] for index in missing],
+                                       found)
+        return await loop.run_in_executor(self._executor, self._finish_markup, [
+            block for (sector, start_index, (start, end)), sector_markup in zip(sectors, sectors_markup)
+            for block in TextMarkUp._clip_markup(text_markup=sector_markup, text=sector, start_index=start_index,
+                                                 start=start, end=end)])
+
+    async def answer(self, questions: List[str], text: str) -> List[str]:
+        """
+        :param questions: The questions about the text
+        :param text: The text
+        :return: The answers in the order of the questions
+        """
+        if self._qa_model is None:
+            raise ValueError(f"The service has no QA model")
+        text = _RE_SPACES.sub(" ", text)
+        return await self._questions.submit([(text, question) for question in questions])
+
+    def stats(self) -> Dict[str, Any]:
+        return {"requests": dict(self._requests),
+                "sectors": self._sectors.stats(),
+                "questions": self._questions.stats()}
+
+    def to_prometheus(self, prefix: str = "ner_service") -> str:
+        stats = self.stats()
+        lines = [f"# HELP {prefix}_requests_total Requests by path and status.",
+                 f"# TYPE {prefix}_requests_total counter"]
+        for (path, status), count in stats["requests"].items():
+            lines.append(f'{prefix}_requests_total{{path="{path}",status="{status}"}} {count}')
+        for name, key, kind, about in [("queue_depth", "queue_depth", "gauge", "Items waiting for the model."),
+                                       ("max_queue", "max_queue", "gauge", "Items that may wait for the model."),
+                                       ("in_flight", "in_flight", "gauge", "Items in the model now."),
+                                       ("batches_total", "batches", "counter", "Calls of the model."),
+                                       ("items_total", "items", "counter", "Items processed by the model."),
+                                       ("rejected_total", "rejected", "counter", "Items rejected by a full queue."),
+                                       ("batch_seconds_total", "batch_seconds", "counter", "Wall time of the calls.")]:
+            lines.append(f"# HELP {prefix}_{name} {about}")
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+            for model in ["sectors", "questions"]:
+                lines.append(f'{prefix}_{name}{{model="{model}"}} {stats[model][key]}')
+        return "\n".join(lines) + "\n"
+
+    def _get_cached_sectors(self, text: str) -> Tuple[List[Tuple[str, int, Tuple[int, int]]],
+                                                       List[List[MarkUpBlock] or None]]:
+        """
+        This method cuts the text into sectors and looks up the markup of every sector in the cache of the marker,
+        so only the missing sectors wait for the model. The sectors without any text have no markup.
+        :return: The sectors (text of the window, offset of the window, (start, end) of the sector) and their markup
+         of the whole window, None when it is missing
+        """
+        cache = self._text_markup.cache
+        windows = self._text_markup._get_sector_windows(text=text, border=self._border)
+        sectors = [(text[context_start: context_end], context_start, (start, end))
+                   for start, end, context_start, context_end in windows]
+        sectors_markup = [[] if len(sector.strip()) == 0 else None for sector, _, _ in sectors]
+        if cache is not None:
+            sectors_markup = [cache.get(model=self._text_markup._cache_model, text=sector, start_index=start_index)
+                              if sector_markup is None else sector_markup
+                              for (sector, start_index, _), sector_markup in zip(sectors, sectors_markup)]
+        return sectors, sectors_markup
+
+    def _put_cached_sectors(self,
+                            sectors: List[Tuple[str, int, Tuple[int, int]]],
+                            sectors_markup: List[List[MarkUpBlock]]) -> None:
+        cache = self._text_markup.cache
+        if cache is None:
+            return
+        for (sector, start_index, _), sector_markup in zip(sectors, sectors_markup):
+            cache.put(model=self._text_markup._cache_model, text=sector, text_markup=sector_markup,
+                      start_index=start_index)
+
+    def _mark_up_sectors(self, sectors: List[Tuple[str, int]]) -> List[List[MarkUpBlock]]:
+        result = [[] for _ in range(len(sectors))]
+        for index, text_markup in self._text_markup._get_sectors_markup(
+                sectors=[(index, sector, start) for index, (sector, start) in enumerate(sectors)],
+                batch_size=len(sectors), cached=False):
+            result[index] = text_markup
+        return result
+
+    def _answer_questions(self, pairs: List[Tuple[str, str]]) -> List[str]:
+        answers = self._qa_model([text for text, _ in pairs], [question for _, question in pairs])
+        return [answers[0][index] if len(answers) > 0 and index < len(answers[0]) else "Without answer!"
+                for index in range(len(pairs))]
+
+    def _finish_markup(self, text_markup: List[MarkUpBlock]) -> List[MarkUpBlock]:
+        tracer = self._text_markup.tracer
+        with tracer.stage("rebuild_markup:bert", blocks_in=len(text_markup)) as record:
+            text_markup = TextMarkUp.rebuild_markup(text_markup=text_markup, delete_empty=True, join_similar=True)
+            record.blocks_out = len(text_markup)
+        return TextMarkUp._finish_markup(text_markup=text_markup, tracer=tracer)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        path = ""
+        try:
+            request_line = (await reader.readline()).decode("latin-1").split()
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode("latin-1").strip()
+                if len(line) == 0:
+                    break
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+            if len(request_line) < 2:
+                status, body = 400, {"error": "Bad request line"}
+            else:
+                method, path = request_line[0], request_line[1]
+                data = await reader.readexactly(int(headers.get("content-length", 0)))
+                status, body = await self._route(method=method, path=path, data=data)
+        except QueueFullError as error:
+            status, body = 503, {"error": str(error)}
+        except (ValueError, KeyError, TypeError) as error:
+            status, body = 400, {"error": str(error)}
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+            return
+        except Exception:
+            _LOGGER.exception(f"Failed to handle the request to {path}")
+            status, body = 500, {"error": "Internal server error"}
+        self._requests[(path, status)] = self._requests.get((path, status), 0) + 1
+        if isinstance(body, str):
+            payload, content_type = body.encode("utf-8"), "text/plain; version=0.0.4"
+        else:
+            payload, content_type = json.dumps(body, ensure_ascii=False).encode("utf-8"), "application/json"
+        head = [f"HTTP/1.1 {status} {_REASONS.get(status, '')}",
+                f"Content-Type: {content_type}; charset=utf-8",
+                f"Content-Length: {len(payload)}",
+                "Connection: close"]
+        if status == 503:
+            head.append("Retry-After: 1")
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + payload)
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+        writer.close()
+
+    async def _route(self, method: str, path: str, data: bytes) -> Tuple[int, Any]:
+        routes = {"/markup": "POST", "/qa": "POST", "/metrics": "GET", "/stats": "GET", "/health": "GET"}
+        if path not in routes:
+            return 404, {"error": f"Unknown path '{path}'"}
+        if method != routes[path]:
+            return 405, {"error": f"Method '{method}' is not allowed for '{path}'"}
+        if path == "/health":
+            return 200, {"status": "ok"}
+        if path == "/metrics":
+            return 200, self.to_prometheus()
+        if path == "/stats":
+            return 200, {key: {str(name): value for name, value in values.items()} if key == "requests" else values
+                         for key, values in self.stats().items()}
+        request = json.loads(data.decode("utf-8"))
+        if path == "/markup":
+            return 200, {"markup": [block.to_json() for block in await self.markup(text=request["text"])]}
+        questions = request["questions"] if "questions" in request else [request["question"]]
+        return 200, {"answers": await self.answer(questions=questions, text=request["text"])}
@@ -0,0 +1,362 @@
+import os
+import sys
+import json
+import mmap
+from array import array
+from NER.compact_markup import *
+from NER.compact_markup import _get_kind, _EXACT, _OWN
+from typing import List, Dict, Any, Iterable, Iterator, Tuple
+
+_VERSION = 1
+_META = "meta.json"
+_NAMES = "names.json"
+# Columns of the store: name -> type code of the array. Every column is a file of the items in the byte order of
+# the machine, the blocks are in the order of the documents and the block ends of the documents split them.
+_COLUMNS = {"starts": "i",  # Start of every block
+            "ends": "i",  # End of every block
+            "types": "B",  # Code of the type of every block, see MarkUpType.code
+            "kinds": "B",  # How the text of every block is taken from the source, see CompactMarkUp
+            "text_refs": "i",  # Index of the own text of every block, -1 when the text is taken from the source
+            "attachment_refs": "i",  # Index of the attachments of every block, -1 when they are empty
+            "document_ends": "q",  # End of the blocks of every document
+            "source_ends": "q",  # End of the source of every document in 'sources.bin'
+            "text_ends": "q",  # End of every own text in 'texts.bin'
+            "attachment_ends": "q",  # End of every attachments json in 'attachments.bin'
+            "type_blocks": "i",  # Indexes of the blocks grouped by type, rebuilt by every close of the writer
+            "type_ends": "q"}  # End of the blocks of every type code in 'type_blocks'
+_BLOBS = ["sources", "texts", "attachments"]  # utf-8 texts joined without separators
+# Sizes in the meta: the size of every column and blob is known from them, the bytes after them are not read
+_SIZES = {"starts": "blocks", "ends": "blocks", "types": "blocks", "kinds": "blocks", "text_refs": "blocks",
+          "attachment_refs": "blocks", "document_ends": "documents", "source_ends": "documents", "text_ends": "texts",
+          "attachment_ends": "attachments", "type_blocks": "blocks", "type_ends": "type_codes"}
+
+
+class MarkUpStoreWriter:
+    """
+    :ru Запись разметки многих документов в колоночное хранилище на диске.
+    :en A writer of the markup of many documents to the columnar store on disk.
+
+    The documents are appended to the column files at once, the meta, the names and the index of the blocks by type
+    are written by 'close', so a store that was not closed is read as it was before the writer was opened.
+    """
+
+    def __init__(self, path: str, append: bool = False) -> None:
+        """
+        :param path: Directory of the store
+        :param append: Whether to add the documents to an existing store, otherwise the store is written anew
+        """
+        self._path = path
+        os.makedirs(path, exist_ok=True)
+        self._meta = {"blocks": 0, "documents": 0, "texts": 0, "attachments": 0, "sources_size": 0,
+                      "texts_size": 0, "attachments_size": 0}
+        self._names = []
+        if not append and os.path.exists(os.path.join(path, _META)):
+            os.remove(os.path.join(path, _META))
+        if append and os.path.exists(os.path.join(path, _META)):
+            meta = _read_meta(path=path)
+            self._meta = {key: meta[key] for key in self._meta}
+            with open(os.path.join(path, _NAMES), "r", encoding="utf-8") as file:
+                self._names = json.load(file)
+        self._files = {}
+        for name, type_code in _COLUMNS.items():
+            if name not in ("type_blocks", "type_ends"):
+                self._files[name] = _open_for_append(path=os.path.join(path, f"{name}.bin"),
+                                                     size=self._meta[_SIZES[name]] * array(type_code).itemsize)
+        for name in _BLOBS:
+            self._files[name] = _open_for_append(path=os.path.join(path, f"{name}.bin"),
+                                                 size=self._meta[f"{name}_size"])
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    def add(self, text_markup: Iterable[MarkUpBlock], source: str, name: str = None) -> int:
+        """
+        :param text_markup: Markup of the source, for example from get_markup or CompactMarkUp
+        :param source: The text witch was marked up
+        :param name: Name of the document, by default its index
+        :return: Index of the document in the store
+        """
+        if self._files is None:
+            raise ValueError(f"The writer is closed")
+        columns = {name: array(_COLUMNS[name]) for name in ["starts", "ends", "types", "kinds", "text_refs",
+                                                            "attachment_refs", "text_ends", "attachment_ends"]}
+        texts = []
+        attachments = []
+        for block in text_markup:
+            kind = _get_kind(source=source, start=block.start, end=block.end, text=block.text)
+            columns["starts"].append(block.start)
+            columns["ends"].append(block.end)
+            columns["types"].append(block.block_type.code)
+            columns["kinds"].append(kind)
+            columns["text_refs"].append(-1)
+            columns["attachment_refs"].append(-1)
+            if kind == _OWN:
+                columns["text_refs"][-1] = self._meta["texts"] + len(texts)
+                texts.append(block.text.encode("utf-8"))
+                self._meta["texts_size"] += len(texts[-1])
+                columns["text_ends"].append(self._meta["texts_size"])
+            if block.attachments:
+                columns["attachment_refs"][-1] = self._meta["attachments"] + len(attachments)
+                attachments.append(json.dumps(block.attachments, ensure_ascii=False).encode("utf-8"))
+                self._meta["attachments_size"] += len(attachments[-1])
+                columns["attachment_ends"].append(self._meta["attachments_size"])
+        source = source.encode("utf-8")
+        self._meta["blocks"] += len(columns["starts"])
+        self._meta["texts"] += len(texts)
+        self._meta["attachments"] += len(attachments)
+        self._meta["sources_size"] += len(source)
+        columns["document_ends"] = array("q", [self._meta["blocks"]])
+        columns["source_ends"] = array("q", [self._meta["sources_size"]])
+        for column_name, column in columns.items():
+            column.tofile(self._files[column_name])
+        self._files["sources"].write(source)
+        self._files["texts"].write(b"".join(texts))
+        self._files["attachments"].write(b"".join(attachments))
+        self._names.append(name if name is not None else str(self._meta["documents"]))
+        self._meta["documents"] += 1
+        return self._meta["documents"] - 1
+
+    def close(self) -> None:
+        """
+        This method writes the index of the blocks by type, the names and the meta of the store.
+        """
+        if self._files is None:
+            return
+        for file in self._files.values():
+            file.close()
+        self._files = None
+        types = array("B")
+        with open(os.path.join(self._path, "types.bin"), "rb") as file:
+            types.fromfile(file, self._meta["blocks"])
+        counts = [0] * len(list(MarkUpType))
+        for code in types:
+            counts[code] += 1
+        type_ends = array("q")
+        for count in counts:
+            type_ends.append((type_ends[-1] if len(type_ends) > 0 else 0) + count)
+        positions = [end - count for end, count in zip(type_ends, counts)]
+        type_blocks = array("i", [0] * len(types))
+        for index, code in enumerate(types):
+            type_blocks[positions[code]] = index
+            positions[code] += 1
+        with open(os.path.join(self._path, "type_blocks.bin"), "wb") as file:
+            type_blocks.tofile(file)
+        with open(os.path.join(self._path, "type_ends.bin"), "wb") as file:
+            type_ends.tofile(file)
+        with open(os.path.join(self._path, _NAMES), "w", encoding="utf-8") as file:
+            json.dump(self._names, file, ensure_ascii=False)
+        meta = dict(self._meta, version=_VERSION, byteorder=sys.byteorder, type_codes=len(type_ends))
+        with open(os.path.join(self._path, f"{_META}.tmp"), "w", encoding="utf-8") as file:
+            json.dump(meta, file)
+        os.replace(os.path.join(self._path, f"{_META}.tmp"), os.path.join(self._path, _META))
+
+    def __enter__(self) -> 'MarkUpStoreWriter':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+
+class MarkUpStore:
+    """
+    :ru Колоночное хранилище разметки многих документов, отображаемое в память.
+    :en A columnar store of the markup of many documents, that is mapped into memory.
+
+    The columns are read through memory maps without parsing, so the markup of one document is taken by slices of
+    the columns, and the blocks of one type across the corpus are taken by the index of the blocks by type. Only the
+    own texts and the attachments of the blocks are parsed when their blocks are asked for. The columns are given as
+    memoryviews for the analytics over the whole corpus, they should be released before the store is closed.
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        :param path: Directory of the store written by MarkUpStoreWriter
+        """
+        self._path = path
+        self._meta = _read_meta(path=path)
+        with open(os.path.join(path, _NAMES), "r", encoding="utf-8") as file:
+            self._names = json.load(file)
+        self._maps = []
+        self._views = []
+        self._columns = {name: self._map(name=name, type_code=type_code, size=self._meta[_SIZES[name]])
+                         for name, type_code in _COLUMNS.items()}
+        self._blobs = {name: self._map(name=name, type_code="B", size=self._meta[f"{name}_size"]) for name in _BLOBS}
+        self._source_index = None
+        self._source = None
+
+    @property
+    def names(self) -> List[str]:
+        return self._names
+
+    @property
+    def starts(self) -> memoryview:
+        return self._columns["starts"]
+
+    @property
+    def ends(self) -> memoryview:
+        return self._columns["ends"]
+
+    @property
+    def types(self) -> memoryview:
+        """
+        Codes of the block types, see MarkUpType.code.
+        """
+        return self._columns["types"]
+
+    @property
+    def document_ends(self) -> memoryview:
+        return self._columns["document_ends"]
+
+    def source(self, index: int) -> str:
+        """
+        :param index: Index of the document
+        :return: The text of the document
+        """
+        index = self._index(index)
+        if self._source_index != index:
+            source_ends = self._columns["source_ends"]
+            start = source_ends[index - 1] if index > 0 else 0
+            self._source = bytes(self._blobs["sources"][start: source_ends[index]]).decode("utf-8")
+            self._source_index = index
+        return self._source
+
+    def get_compact_markup(self, index: int) -> CompactMarkUp:
+        """
+        :param index: Index of the document
+        :return: The markup of the document
+        """
+        index = self._index(index)
+        document_ends = self._columns["document_ends"]
+        start, end = document_ends[index - 1] if index > 0 else 0, document_ends[index]
+        texts = {}
+        attachments = {}
+        for block_index in range(start, end):
+            if self._columns["text_refs"][block_index] >= 0:
+                texts[block_index - start] = self._get_text(block_index=block_index)
+            if self._columns["attachment_refs"][block_index] >= 0:
+                attachments[block_index - start] = self._get_attachments(block_index=block_index)
+        return CompactMarkUp.from_arrays(source=self.source(index),
+                                         starts=array("i", self._columns["starts"][start: end]),
+                                         ends=array("i", self._columns["ends"][start: end]),
+                                         types=array("B", self._columns["types"][start: end]),
+                                         kinds=array("B", self._columns["kinds"][start: end]),
+                                         texts=texts, attachments=attachments)
+
+    def get_markup(self, index: int) -> List[MarkUpBlock]:
+        """
+        :param index: Index of the document
+        :return: The markup of the document like get_markup gave it
+        """
+        return self.get_compact_markup(index=index).to_blocks()
+
+    def count(self, block_type: MarkUpType) -> int:
+        """
+        :param block_type: Type of the blocks
+        :return: Count of the blocks of the type in the store
+        """
+        start, end = self._get_type_range(block_type=block_type)
+        return end - start
+
+    def search(self, block_type: MarkUpType) -> Iterator[Tuple[int, MarkUpBlock]]:
+        """
+        This method walks the blocks of the type across the store in the order of the documents.
+        :param block_type: Type of the blocks
+        :return: Iterator of (index of the document, block)
+        """
+        start, end = self._get_type_range(block_type=block_type)
+        document_ends = self._columns["document_ends"]
+        document = 0
+        for position in range(start, end):
+            block_index = self._columns["type_blocks"][position]
+            while document_ends[document] <= block_index:
+                document += 1
+            yield document, self._get_block(document=document, block_index=block_index)
+
+    def close(self) -> None:
+        for view in reversed(self._views):
+            view.release()
+        for memory_map in self._maps:
+            memory_map.close()
+        self._views = []
+        self._maps = []
+
+    def __enter__(self) -> 'MarkUpStore':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self._meta["documents"]
+
+    def _map(self, name: str, type_code: str, size: int) -> memoryview:
+        size *= array(type_code).itemsize
+        if size == 0:
+            return memoryview(b"").cast(type_code)
+        with open(os.path.join(self._path, f"{name}.bin"), "rb") as file:
+            memory_map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._maps.append(memory_map)
+        self._views.append(memoryview(memory_map))
+        self._views.append(self._views[-1][:size])
+        self._views.append(self._views[-1].cast(type_code))
+        return self._views[-1]
+
+    def _get_type_range(self, block_type: MarkUpType) -> Tuple[int, int]:
+        code = block_type.code
+        type_ends = self._columns["type_ends"]
+        if code >= len(type_ends):
+            return 0, 0
+        return type_ends[code - 1] if code > 0 else 0, type_ends[code]
+
+    def _get_block(self, document: int, block_index: int) -> MarkUpBlock:
+        start, end = self._columns["starts"][block_index], self._columns["ends"][block_index]
+        if self._columns["text_refs"][block_index] >= 0:
+            text = self._get_text(block_index=block_index)
+        else:
+            text = self.source(document)[start: end]
+            if self._columns["kinds"][block_index] != _EXACT:
+                text = text.strip()
+        attachments = self._get_attachments(block_index) if self._columns["attachment_refs"][block_index] >= 0 else {}
+        return MarkUpBlock(text=text, block_type=MarkUpType.from_code(self._columns["types"][block_index]),
+                           start=start, end=end, attachments=attachments)
+
+    def _get_text(self, block_index: int) -> str:
+        return self._get_blob(name="texts", ends=self._columns["text_ends"],
+                              index=self._columns["text_refs"][block_index])
+
+    def _get_attachments(self, block_index: int) -> Dict[str, Any]:
+        return json.loads(self._get_blob(name="attachments", ends=self._columns["attachment_ends"],
+                                         index=self._columns["attachment_refs"][block_index]))
+
+    def _get_blob(self, name: str, ends: memoryview, index: int) -> str:
+        return bytes(self._blobs[name][ends[index - 1] if index > 0 else 0: ends[index]]).decode("utf-8")
+
+    def _index(self, index: int) -> int:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(f"Document index out of range")
+        return index
+
+
+def _read_meta(path: str) -> Dict[str, Any]:
+    with open(os.path.join(path, _META), "r", encoding="utf-8") as file:
+        meta = json.load(file)
+    if meta.get("version") != _VERSION:
+        raise ValueError(f"Expected the store of version {_VERSION}, but got {meta.get('version')}")
+    if meta.get("byteorder") != sys.byteorder:
+        raise ValueError(f"The store was written with the {meta.get('byteorder')} byte order, "
+                         f"but this machine has the {sys.byteorder} one")
+    return meta
+
+
+def _open_for_append(path: str, size: int):
+    """
+    This function opens the file for appending after its first 'size' bytes, the bytes after them are cut,
+    they are left by a writer that was not closed.
+    """
+    file = open(path, "ab")
+    file.truncate(size)
+    file.seek(size)
+    return file
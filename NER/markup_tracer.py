@@ -0,0 +1,130 @@
+import time
+import threading
+from contextlib import contextmanager
+from NER.mark_up_type import *
+from typing import Dict, Callable, Iterable, Iterator
+
+
+class StageRecord:
+    """
+    :ru Запись об одном вызове этапа разметки.
+    :en A record of one call of a markup stage.
+    """
+    __slots__ = ("stage", "seconds", "blocks_in", "blocks_out", "matches")
+
+    def __init__(self, stage: str, blocks_in: int = 0) -> None:
+        self.stage = stage
+        self.seconds = 0.0
+        self.blocks_in = blocks_in
+        self.blocks_out = 0
+        self.matches = {}
+
+    def count_matches(self, text_markup, block_types: Iterable[MarkUpType] = None) -> None:
+        """
+        Counts the marked up blocks of the markup by their types, the unmarked blocks are skipped.
+        :param text_markup: Markup with the blocks to count
+        :param block_types: The only types to count, all by default
+        """
+        block_types = set(block_types) if block_types is not None else None
+        for block in text_markup:
+            if block.block_type != MarkUpType.NOTHING and (block_types is None or block.block_type in block_types):
+                self.matches[block.block_type.value] = self.matches.get(block.block_type.value, 0) + 1
+
+    def to_json(self) -> dict:
+        return {"stage": self.stage,
+                "seconds": self.seconds,
+                "blocks_in": self.blocks_in,
+                "blocks_out": self.blocks_out,
+                "matches": self.matches}
+
+
+class MarkUpTracer:
+    """
+    :ru Базовый трассировщик этапов разметки, ничего не делает с записями.
+    :en The base tracer of the markup stages, it does nothing with the records.
+
+    TextMarkUp opens a stage with 'stage', fills the counters of the yielded record, and the record is given to
+    'on_stage' when the stage is over. Subclasses override 'on_stage'.
+    """
+
+    @contextmanager
+    def stage(self, name: str, blocks_in: int = 0) -> Iterator[StageRecord]:
+        record = StageRecord(stage=name, blocks_in=blocks_in)
+        started = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record.seconds = time.perf_counter() - started
+            self.on_stage(record)
+
+    def on_stage(self, record: StageRecord) -> None:
+        pass
+
+
+class CallbackTracer(MarkUpTracer):
+    """
+    :ru Трассировщик, передающий каждую запись в функцию.
+    :en A tracer that passes every record to the function.
+    """
+
+    def __init__(self, callback: Callable[[StageRecord], None]) -> None:
+        self._callback = callback
+
+    def on_stage(self, record: StageRecord) -> None:
+        self._callback(record)
+
+
+class StatsTracer(MarkUpTracer):
+    """
+    :ru Трассировщик, накапливающий счетчики по этапам.
+    :en A tracer that sums the counters by stages.
+
+    The counters are given as a dict by 'stats' or as a text in the Prometheus exposition format by 'to_prometheus'.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def on_stage(self, record: StageRecord) -> None:
+        with self._lock:
+            stats = self._stats.setdefault(record.stage, {"calls": 0,
+                                                          "seconds": 0.0,
+                                                          "max_seconds": 0.0,
+                                                          "blocks_in": 0,
+                                                          "blocks_out": 0,
+                                                          "matches": {}})
+            stats["calls"] += 1
+            stats["seconds"] += record.seconds
+            stats["max_seconds"] = max(stats["max_seconds"], record.seconds)
+            stats["blocks_in"] += record.blocks_in
+            stats["blocks_out"] += record.blocks_out
+            for block_type, count in record.matches.items():
+                stats["matches"][block_type] = stats["matches"].get(block_type, 0) + count
+
+    def stats(self) -> Dict[str, dict]:
+        with self._lock:
+            return {stage: dict(stats, matches=dict(stats["matches"])) for stage, stats in self._stats.items()}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats = {}
+
+    def to_prometheus(self, prefix: str = "ner_markup") -> str:
+        stats = self.stats()
+        lines = []
+        for name, key, kind, about in [("stage_calls_total", "calls", "counter", "Calls of the stage."),
+                                       ("stage_seconds_total", "seconds", "counter", "Wall time of the stage."),
+                                       ("stage_max_seconds", "max_seconds", "gauge", "The longest call of the stage."),
+                                       ("stage_blocks_in_total", "blocks_in", "counter", "Blocks given to the stage."),
+                                       ("stage_blocks_out_total", "blocks_out", "counter", "Blocks made by the stage.")]:
+            lines.append(f"# HELP {prefix}_{name} {about}")
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+            for stage, stage_stats in stats.items():
+                lines.append(f'{prefix}_{name}{{stage="{stage}"}} {stage_stats[key]}')
+        lines.append(f"# HELP {prefix}_matches_total Blocks of the type found by the stage.")
+        lines.append(f"# TYPE {prefix}_matches_total counter")
+        for stage, stage_stats in stats.items():
+            for block_type, count in stage_stats["matches"].items():
+                lines.append(f'{prefix}_matches_total{{stage="{stage}",type="{block_type}"}} {count}')
+        return "\n".join(lines) + "\n"
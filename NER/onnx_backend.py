@@ -0,0 +1,216 @@
+import os
+import tempfile
+from typing import List, Dict, Any, Callable
+
+# onnxruntime, torch and transformers are imported when the backend is attached, so they are needed only with it.
+# pip install onnx onnxruntime
+
+# Backends of the NER model: the DeepPavlov torch model, its onnx copy and its onnx copy with int8 weights
+_BACKENDS = ["torch", "onnx", "onnx-int8"]
+# The least share of the same blocks of the quantized model, the rounding of int8 may change a few tags
+_INT8_MIN_SAME_BLOCKS = 0.99
+
+
+class OnnxTagger:
+    """
+    :ru Замена torch модели теггера DeepPavlov, выполняющая ее экспортированную копию в onnxruntime.
+    :en A replacement of the torch model of the DeepPavlov tagger, that runs its exported copy in onnxruntime.
+
+    The preprocessing of the texts and the choice of tags stay in the DeepPavlov pipeline, only the call of the
+    transformer is replaced, so the model gives the same tokens and tags as with torch, up to the precision of
+    the weights when they are quantized.
+    """
+
+    def __init__(self, path: str, session_options=None) -> None:
+        """
+        :param path: Path of the onnx file
+        :param session_options: onnxruntime.SessionOptions, the defaults of onnxruntime by default
+        """
+        import onnxruntime
+        self._path = path
+        self._session = onnxruntime.InferenceSession(path, sess_options=session_options,
+                                                     providers=["CPUExecutionProvider"])
+        self._inputs = [model_input.name for model_input in self._session.get_inputs()]
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    def __call__(self, input_ids, attention_mask=None, token_type_ids=None, **kwargs):
+        import torch
+        from transformers.modeling_outputs import TokenClassifierOutput
+        if attention_mask is None:
+            attention_mask = torch.ones_like(input_ids)
+        if token_type_ids is None:
+            token_type_ids = torch.zeros_like(input_ids)
+        feed = {"input_ids": input_ids, "attention_mask": attention_mask, "token_type_ids": token_type_ids}
+        logits = self._session.run(["logits"], {name: feed[name].cpu().numpy().astype("int64")
+                                                for name in self._inputs})[0]
+        return TokenClassifierOutput(logits=torch.from_numpy(logits).to(input_ids.device))
+
+    def to(self, *args, **kwargs) -> 'OnnxTagger':
+        return self
+
+    def eval(self) -> 'OnnxTagger':
+        return self
+
+    def train(self, mode: bool = True) -> 'OnnxTagger':
+        if mode:
+            raise ValueError(f"The onnx model can not be trained")
+        return self
+
+
+def attach_onnx_backend(ner_model, path: str, quantize: bool = False, session_options=None) -> OnnxTagger:
+    """
+    This function exports the transformer of the DeepPavlov NER pipeline to onnx, when the file does not exist yet,
+    optionally quantizes its weights to int8, and puts the onnx model in place of the torch one.
+    :param ner_model: The DeepPavlov pipeline, for example build_model(configs.ner.ner_rus_bert)
+    :param path: Path of the onnx file, the quantized model is kept beside it with the '.int8.onnx' suffix
+    :param quantize: Whether to use the dynamic int8 quantization of the weights
+    :param session_options: onnxruntime.SessionOptions
+    :return: OnnxTagger
+    """
+    tagger = _find_tagger(ner_model=ner_model)
+    if not os.path.exists(path):
+        tokenizer = _find_tokenizer(ner_model=ner_model)
+        _write_atomically(path=path, write=lambda temp_path: _export(model=tagger.model, tokenizer=tokenizer,
+                                                                     path=temp_path))
+    if quantize:
+        quantized_path = f"{os.path.splitext(path)[0]}.int8.onnx"
+        if not os.path.exists(quantized_path):
+            from onnxruntime.quantization import quantize_dynamic, QuantType
+            _write_atomically(path=quantized_path,
+                              write=lambda temp_path: quantize_dynamic(model_input=path, model_output=temp_path,
+                                                                       weight_type=QuantType.QInt8))
+        path = quantized_path
+    tagger.model = OnnxTagger(path=path, session_options=session_options)
+    return tagger.model
+
+
+def get_session_options(num_threads: int = None, num_interop_threads: int = None):
+    """
+    :param num_threads: Count of the intra-op threads
+    :param num_interop_threads: Count of the inter-op threads
+    :return: onnxruntime.SessionOptions with the thread counts, or None for the defaults of onnxruntime
+    """
+    if num_threads is None and num_interop_threads is None:
+        return None
+    import onnxruntime
+    session_options = onnxruntime.SessionOptions()
+    if num_threads is not None:
+        session_options.intra_op_num_threads = num_threads
+    if num_interop_threads is not None:
+        session_options.inter_op_num_threads = num_interop_threads
+    return session_options
+
+
+def get_onnx_path(model_name: str) -> str:
+    """
+    :param model_name: Name of the DeepPavlov config
+    :return: The default path of the onnx file in the DeepPavlov directory of the user
+    """
+    return os.path.join(os.path.expanduser("~"), ".deeppavlov", "onnx", f"{model_name}.onnx")
+
+
+def _find_tagger(ner_model):
+    import torch
+    for item in ner_model.pipe:
+        component = item[-1]
+        if isinstance(getattr(component, "model", None), (torch.nn.Module, OnnxTagger)):
+            return component
+    raise ValueError(f"The pipeline has no torch model to export")
+
+
+def _find_tokenizer(ner_model):
+    for item in ner_model.pipe:
+        tokenizer = getattr(item[-1], "tokenizer", None)
+        if tokenizer is not None and callable(tokenizer):
+            return tokenizer
+    raise ValueError(f"The pipeline has no transformers tokenizer")
+
+
+def _write_atomically(path: str, write: Callable[[str], None]) -> None:
+    """
+    This function writes the file to a temporary path in the same directory and moves it to its path after that, so
+    an interrupted or concurrent export never leaves a truncated model at the path.
+    :param path: Path of the file
+    :param write: The function that writes the file to the path given to it
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    descriptor, temp_path = tempfile.mkstemp(suffix=".onnx", prefix=f".{os.path.basename(path)}.", dir=directory)
+    os.close(descriptor)
+    try:
+        write(temp_path)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def _export(model, tokenizer, path: str) -> None:
+    import torch
+    model = model.eval().to("cpu")
+    sample = tokenizer(["Пример текста"], return_tensors="pt")
+    names = [name for name in ["input_ids", "attention_mask", "token_type_ids"] if name in sample]
+    axes = {name: {0: "batch", 1: "sequence"} for name in names}
+    axes["logits"] = {0: "batch", 1: "sequence"}
+    with torch.no_grad():
+        torch.onnx.export(model, tuple(sample[name] for name in names), path, input_names=names,
+                          output_names=["logits"], dynamic_axes=axes, opset_version=14)
+
+
+def compare_markups(reference: List[List[Dict[str, Any]]], candidate: List[List[Dict[str, Any]]]) -> Dict[str, Any]:
+    """
+    This function compares the markups of the same texts by two backends.
+    :param reference: Markups in json by the torch backend
+    :param candidate: Markups in json by the other backend
+    :return: Count of the texts, indexes of the texts with other markups and the share of the same blocks
+    """
+    different = [index for index, (first, second) in enumerate(zip(reference, candidate)) if first != second]
+    same = sum(len(set(map(_block_key, first)) & set(map(_block_key, second)))
+               for first, second in zip(reference, candidate))
+    total = sum(max(len(first), len(second)) for first, second in zip(reference, candidate))
+    return {"texts": len(reference), "different": different, "same_blocks": same / total if total > 0 else 1.0}
+
+
+def check_parity(reference,
+                 candidate,
+                 texts: List[str],
+                 min_same_blocks: float = None,
+                 skip: bool = True) -> Dict[str, Any]:
+    """
+    This function marks up the texts by the torch backend and by the other one and checks that their markups agree.
+    The markups must be the same, only the quantized model may tag a little differently. The check is skipped,
+    when the model or the backend can not be loaded, for example when the model is not downloaded or onnxruntime
+    is not installed.
+    :param reference: TextMarkUp with the torch backend
+    :param candidate: TextMarkUp with the other backend or chunker
+    :param texts: Texts of the check
+    :param min_same_blocks: The least share of the same blocks, by default the markups must be the same with
+     the 'onnx' backend and agree by _INT8_MIN_SAME_BLOCKS with the 'onnx-int8' one
+    :param skip: Whether the check is skipped when the model or the backend can not be loaded, else the error is raised
+    :return: The result of compare_markups, or the reason of the skip in 'skipped'
+    """
+    try:
+        reference.load()
+        candidate.load()
+    except (ImportError, OSError) as error:
+        if not skip:
+            raise
+        return {"skipped": f"{type(error).__name__}: {error}"}
+    if min_same_blocks is None and candidate.backend == "onnx-int8":
+        min_same_blocks = _INT8_MIN_SAME_BLOCKS
+    result = compare_markups(reference=[[block.to_json() for block in reference.get_markup(text)] for text in texts],
+                             candidate=[[block.to_json() for block in candidate.get_markup(text)] for text in texts])
+    if min_same_blocks is None and len(result["different"]) > 0:
+        raise ValueError(f"The markups differ in texts {result['different']}, they agree by "
+                         f"{result['same_blocks']:.4f} of the blocks")
+    if min_same_blocks is not None and result["same_blocks"] < min_same_blocks:
+        raise ValueError(f"The markups agree by {result['same_blocks']:.4f} of the blocks, but at least "
+                         f"{min_same_blocks} is needed, texts {result['different']} differ")
+    return result
+
+
+def _block_key(block: Dict[str, Any]) -> tuple:
+    return block["block_type"], block["start"], block["end"], block["text"]
@@ -0,0 +1,154 @@
+import math
+from bisect import bisect_right
+from collections import Counter
+from NER.mark_up_block import *
+from typing import List, Tuple, Callable, Iterable
+
+# Words of a question and the types of blocks that answer it, a passage with such a block is boosted
+_QUESTION_TYPES = [("инн", [MarkUpType.INN]),
+                   ("кпп", [MarkUpType.KPP]),
+                   ("огрн", [MarkUpType.OGRN]),
+                   ("окпо", [MarkUpType.OKPO]),
+                   ("октмо", [MarkUpType.OKTMO]),
+                   ("окато", [MarkUpType.OKATO]),
+                   ("икз", [MarkUpType.IKZ]),
+                   ("снилс", [MarkUpType.SNILS]),
+                   ("бик", [MarkUpType.BIC]),
+                   ("банк", [MarkUpType.BIC, MarkUpType.ORGANIZATION]),
+                   ("телефон", [MarkUpType.PHONE]),
+                   ("почт", [MarkUpType.EMAIL]),
+                   ("сайт", [MarkUpType.URL]),
+                   ("зовут", [MarkUpType.PERSON]),
+                   ("кто", [MarkUpType.PERSON, MarkUpType.ORGANIZATION]),
+                   ("цен", [MarkUpType.MONEY]),
+                   ("сумм", [MarkUpType.MONEY]),
+                   ("стоимост", [MarkUpType.MONEY]),
+                   ("когда", [MarkUpType.DATE]),
+                   ("дат", [MarkUpType.DATE]),
+                   ("срок", [MarkUpType.DATE]),
+                   ("адрес", [MarkUpType.GPE, MarkUpType.LOCATION])]
+
+
+class PassageIndex:
+    """
+    :ru Индекс фрагментов текста для поиска фрагментов, отвечающих на вопрос, по BM25.
+    :en An index of the passages of a text for searching the passages that answer a question by BM25.
+
+    The text is cut into passages of about 'passage_size' chars at the ends of lines, the words are lowered and cut
+    to 'stem_length' chars, that is enough to match the forms of russian words. When the markup of the text is given,
+    the passages with blocks of the type that the question asks about are boosted.
+    """
+
+    def __init__(self,
+                 text: str,
+                 tokenize: Callable[[str], List[str]],
+                 passage_size: int = 1000,
+                 text_markup: Iterable[MarkUpBlock] = None,
+                 stem_length: int = 4,
+                 k1: float = 1.5,
+                 b: float = 0.75) -> None:
+        """
+        :param text: The text witch is searched
+        :param tokenize: The tokenizer of the text, for example TextMarkUp.tokenizer.tokenize
+        :param passage_size: Count of chars in one passage
+        :param text_markup: Markup of the text for boosting the passages
+        :param stem_length: Count of the first chars of a word that are compared
+        :param k1: Saturation of the count of a word in a passage
+        :param b: Weight of the length of a passage
+        """
+        if passage_size <= 0:
+            raise ValueError(f"Passage size should be grater then zero")
+        self._text = text
+        self._tokenize = tokenize
+        self._stem_length = stem_length
+        self._k1 = k1
+        self._b = b
+        self._spans = PassageIndex._get_passage_spans(text=text, passage_size=passage_size)
+        self._counts = [Counter(self._get_words(text=text[start: end])) for start, end in self._spans]
+        self._lengths = [sum(counts.values()) for counts in self._counts]
+        self._average_length = sum(self._lengths) / len(self._lengths) if len(self._lengths) > 0 else 0
+        documents = Counter(word for counts in self._counts for word in counts)
+        self._idf = {word: math.log(1 + (len(self._counts) - count + 0.5) / (count + 0.5))
+                     for word, count in documents.items()}
+        self._types = [set() for _ in range(len(self._spans))]
+        if text_markup is not None:
+            starts = [start for start, _ in self._spans]
+            for block in text_markup:
+                if block.block_type != MarkUpType.NOTHING and len(starts) > 0:
+                    self._types[max(bisect_right(starts, block.start) - 1, 0)].add(block.block_type)
+
+    @property
+    def passages(self) -> List[Tuple[int, int]]:
+        """
+        The (start, end) spans of the passages in the text.
+        """
+        return self._spans
+
+    def search(self, question: str, top_k: int = 3, boost: float = 0.5) -> List[Tuple[int, float]]:
+        """
+        This method gives the passages that answer the question best.
+        :param question: The question
+        :param top_k: Count of the passages
+        :param boost: Share of the best score added to the passages with blocks of the asked types, the boost itself
+         when no passage has the words of the question, so such passage is promoted even without these words
+        :return: List of pairs (index of the passage, score) from the best one
+        """
+        words = set(self._get_words(text=question))
+        block_types = PassageIndex._get_question_types(question=question)
+        scores = []
+        for index, counts in enumerate(self._counts):
+            score = 0.0
+            norm = self._k1 * (1 - self._b + self._b * self._lengths[index] / self._average_length) \
+                if self._average_length > 0 else self._k1
+            for word in words:
+                count = counts.get(word, 0)
+                if count > 0:
+                    score += self._idf[word] * count * (self._k1 + 1) / (count + norm)
+            scores.append((index, score))
+        best = max((score for _, score in scores), default=0.0)
+        bonus = boost * (best if best > 0 else 1.0)
+        scores = [(index, score + bonus if len(block_types & self._types[index]) > 0 else score)
+                  for index, score in scores]
+        scores.sort(key=lambda x: -x[1])
+        return scores[:top_k]
+
+    def get_context(self, question: str, top_k: int = 3, boost: float = 0.5) -> str:
+        """
+        This method gives the best passages for the question joined in the order of the text.
+        :param question: The question
+        :param top_k: Count of the passages
+        :param boost: Share of the best score added to the passages with blocks of the asked types, see search
+        :return: str
+        """
+        indexes = sorted(index for index, _ in self.search(question=question, top_k=top_k, boost=boost))
+        return "\n".join(self._text[self._spans[index][0]: self._spans[index][1]] for index in indexes)
+
+    def _get_words(self, text: str) -> List[str]:
+        return [token.lower()[:self._stem_length] for token in self._tokenize(text)
+                if any(char.isalnum() for char in token)]
+
+    @staticmethod
+    def _get_question_types(question: str) -> set:
+        question = question.lower()
+        return {block_type for word, block_types in _QUESTION_TYPES if word in question for block_type in block_types}
+
+    @staticmethod
+    def _get_passage_spans(text: str, passage_size: int) -> List[Tuple[int, int]]:
+        """
+        This method cuts the text into passages of at most 'passage_size' chars at the last end of line, or at the last
+        space, when the passage has no ends of lines, the passages without any text are skipped.
+        """
+        spans = []
+        start = 0
+        while start < len(text):
+            end = min(start + passage_size, len(text))
+            if end < len(text):
+                cut = text.rfind("\n", start, end)
+                if cut <= start:
+                    cut = text.rfind(" ", start, end)
+                if cut > start:
+                    end = cut + 1
+            if len(text[start: end].strip()) > 0:
+                spans.append((start, end))
+            start = end
+        return spans
@@ -0,0 +1,131 @@
+import re
+from bisect import bisect_right
+from typing import List, Dict, Any, Tuple
+
+# Words that start the part of a party in the requisites and the signatures of a contract
+_PARTIES = {"supplier": ["поставщик", "исполнитель", "подрядчик", "продавец"],
+            "customer": ["заказчик", "покупатель"]}
+
+# A line that starts a section: an annex, a part of the contract, a numbered clause or a party
+_RE_HEADING = re.compile(r"^[ \t]*(?:(?P<annex>приложение[ \t]*№[ \t]*\d+)[ \t]*$"
+                         r"|(?P<part>часть[ \t]+\d+\b.*)$"
+                         r"|(?P<number>\d+)\.[ \t]+(?P<clause>[^\W\d_].*)$"
+                         r"|(?P<party>" + "|".join(word for words in _PARTIES.values() for word in words) +
+                         r")[ \t]*(?::.*)?$)", re.IGNORECASE | re.MULTILINE)
+_PARTY_WORDS = {word: party for party, words in _PARTIES.items() for word in words}
+
+
+class Section:
+    """
+    :ru Раздел документа: преамбула, пункт, часть, реквизиты стороны или приложение.
+    :en A section of the document: the preamble, a clause, a part, the requisites of a party or an annex.
+    """
+    __slots__ = ("_kind", "_start", "_end", "_title", "_party")
+
+    def __init__(self, kind: str, start: int, end: int, title: str = "", party: str = None) -> None:
+        self._kind = kind
+        self._start = start
+        self._end = end
+        self._title = title
+        self._party = party
+
+    @property
+    def kind(self) -> str:
+        """
+        One of 'preamble', 'clause', 'part', 'party' and 'annex'.
+        """
+        return self._kind
+
+    @property
+    def start(self) -> int:
+        return self._start
+
+    @property
+    def end(self) -> int:
+        return self._end
+
+    @property
+    def title(self) -> str:
+        return self._title
+
+    @property
+    def party(self) -> str or None:
+        """
+        The party of a 'party' section, see '_PARTIES'.
+        """
+        return self._party
+
+    def to_json(self) -> Dict[str, Any]:
+        return {"kind": self._kind,
+                "start": self._start,
+                "end": self._end,
+                "title": self._title,
+                "party": self._party}
+
+
+class SectionIndex:
+    """
+    :ru Индекс разделов документа по положению в тексте.
+    :en An index of the sections of a document by their places in the text.
+
+    The text is walked once, every heading line starts a section that lasts until the next heading, the text before
+    the first heading is the preamble. The sections of the parties are found by the lines with the name of the party,
+    so they are found in any order of the parties, and a party may have several sections (requisites and signatures).
+    """
+
+    def __init__(self, text: str) -> None:
+        self._sections = []
+        start = 0
+        kind, title, party = "preamble", "", None
+        for heading in _RE_HEADING.finditer(text):
+            if heading.start() > start or kind != "preamble":
+                self._sections.append(Section(kind=kind, start=start, end=heading.start(), title=title, party=party))
+            start = heading.start()
+            kind, party = heading.lastgroup, None
+            if kind == "clause":
+                title = f"{heading.group('number')}. {heading.group('clause').strip()}"
+            elif kind == "party":
+                party = _PARTY_WORDS[heading.group("party").lower()]
+                title = heading.group().strip()
+            else:
+                title = heading.group(kind).strip()
+        if len(text) > start or kind != "preamble":
+            self._sections.append(Section(kind=kind, start=start, end=len(text), title=title, party=party))
+        self._starts = [section.start for section in self._sections]
+
+    @property
+    def sections(self) -> List[Section]:
+        return self._sections
+
+    def search(self, kind: str = None, party: str = None) -> List[Section]:
+        """
+        :param kind: Kind of the sections, any by default
+        :param party: Party of the sections, any by default
+        :return: List[Section] in the order of the text
+        """
+        return [section for section in self._sections
+                if (kind is None or section.kind == kind) and (party is None or section.party == party)]
+
+    def section_at(self, position: int) -> Section or None:
+        """
+        :param position: Place in the text
+        :return: The section that contains the place
+        """
+        index = bisect_right(self._starts, position) - 1
+        if index < 0 or position >= self._sections[index].end:
+            return None
+        return self._sections[index]
+
+    def spans(self, kind: str = None, party: str = None) -> List[Tuple[int, int]]:
+        """
+        :param kind: Kind of the sections, any by default
+        :param party: Party of the sections, any by default
+        :return: The (start, end) spans of the sections
+        """
+        return [(section.start, section.end) for section in self.search(kind=kind, party=party)]
+
+    def to_json(self) -> List[Dict[str, Any]]:
+        return [section.to_json() for section in self._sections]
+
+    def __len__(self) -> int:
+        return len(self._sections)
@@ -0,0 +1,164 @@
+import re
+from bisect import bisect_left
+from typing import List, Tuple, Callable
+
+# A token that ends a sentence, the sectors are cut after such tokens or at the ends of lines
+_RE_SENTENCE_END = re.compile(r"[.!?…;]$")
+# Count of the special tokens that the model adds to every sector: [CLS] and [SEP]
+_SPECIAL_TOKENS = 2
+_SUBWORDS_CACHE_SIZE = 100000
+
+
+class SectorChunker:
+    """
+    :ru Разбиение текста на секторы для модели с учетом предложений, лимита подслов модели и перекрытия.
+    :en A splitter of the text into sectors for the model, that respects the sentences, the subword limit of the model
+     and the overlap of the sectors.
+
+    The sectors own spans of the text that follow each other and cover all tokens. The model gets the span of
+    a sector with 'overlap' tokens of context on both sides, and the markup of this window is cut back to the span,
+    so every token is tagged by the sector where it has the most context, and an entity cut by the border of two spans
+    is joined again by rebuild_markup. A sector takes no more than 'border' tokens and, with 'max_subwords', no more
+    subwords with its context than the model takes. With 'sentences' the sector ends at the last end of a sentence or
+    a line in its second half, when there is one. By default the text is cut every 200 tokens without context.
+    """
+
+    def __init__(self,
+                 border: int = 200,
+                 overlap: int = 0,
+                 sentences: bool = False,
+                 max_subwords: int = None,
+                 subword_tokenize: Callable[[str], List[str]] = None) -> None:
+        """
+        :param border: The greatest count of tokens in the span of a sector, None for no limit but the subwords
+        :param overlap: Count of tokens of context on every side of the span
+        :param sentences: Whether to cut the sectors at the ends of sentences and lines
+        :param max_subwords: The greatest length of the input of the model with the special tokens, for example 512 for
+         ner_rus_bert, by default the subwords are not counted
+        :param subword_tokenize: The tokenizer of the model, by default TextMarkUp takes the one of its model
+        """
+        if border is None and max_subwords is None:
+            raise ValueError(f"Border or max subwords should be set")
+        if border is not None and border <= 0:
+            raise ValueError(f"Border should be grater then zero")
+        if overlap < 0:
+            raise ValueError(f"Overlap should not be less then zero")
+        if max_subwords is not None and max_subwords <= _SPECIAL_TOKENS:
+            raise ValueError(f"Max subwords should be grater then {_SPECIAL_TOKENS}")
+        self._border = border
+        self._overlap = overlap
+        self._sentences = sentences
+        self._max_subwords = max_subwords
+        self.subword_tokenize = subword_tokenize
+        self._subwords = {}
+
+    @property
+    def border(self) -> int or None:
+        return self._border
+
+    @property
+    def overlap(self) -> int:
+        return self._overlap
+
+    @property
+    def max_subwords(self) -> int or None:
+        return self._max_subwords
+
+    def split(self,
+              text: str,
+              token_spans: List[Tuple[int, int]],
+              start: int = 0,
+              final: bool = True,
+              border: int = None) -> List[Tuple[int, int, int, int]]:
+        """
+        This method cuts the text into sectors. The span of the last sector ends with the last token and is empty
+        when the text has no tokens left for it.
+        :param text: The text
+        :param token_spans: The (start, end) spans of the tokens of the text
+        :param start: Where the first sector starts, the tokens before it are only the context of the first sector
+        :param final: Whether the text is whole, otherwise only the sectors that do not depend on the last token,
+         witch may be cut, are given
+        :param border: The greatest count of tokens in a sector, by default the one set in the constructor
+        :return: List of (start, end, context start, context end) of the sectors
+        """
+        if border is None:
+            border = self._border
+        count = len(token_spans)
+        counts = self._get_prefix_counts(text=text, token_spans=token_spans) if self._max_subwords is not None else None
+        sectors = []
+        sector_start = start
+        index = bisect_left([token_start for token_start, _ in token_spans], start)
+        while index < count:
+            stop = count if border is None else min(count, index + border)
+            if counts is not None:
+                stop = self._fit(counts=counts, index=index, stop=stop)
+            if stop == count and (border is None or stop - index < border):
+                break
+            examined = stop + self._overlap if counts is not None else stop - 1 + self._overlap
+            if not final and examined >= count - 1:
+                return sectors
+            if self._sentences:
+                stop = self._find_sentence_end(text=text, token_spans=token_spans, index=index, stop=stop)
+            sectors.append(self._get_window(token_spans=token_spans, counts=counts, index=index, stop=stop,
+                                            start=sector_start, end=token_spans[stop - 1][1]))
+            sector_start = token_spans[stop - 1][1]
+            index = stop
+        if final:
+            sectors.append(self._get_window(token_spans=token_spans, counts=counts, index=index, stop=count,
+                                            start=sector_start,
+                                            end=max(sector_start, token_spans[-1][1]) if count > 0 else sector_start))
+        return sectors
+
+    def _fit(self, counts: List[int], index: int, stop: int) -> int:
+        """
+        :return: The greatest end of the tokens of the sector, whose window with the whole context fits the model,
+         at least one token is taken
+        """
+        budget = self._max_subwords - _SPECIAL_TOKENS
+        context_start = max(0, index - self._overlap)
+        for end in range(index + 1, stop + 1):
+            if counts[min(len(counts) - 1, end + self._overlap)] - counts[context_start] > budget:
+                return max(index + 1, end - 1)
+        return stop
+
+    @staticmethod
+    def _find_sentence_end(text: str, token_spans: List[Tuple[int, int]], index: int, stop: int) -> int:
+        for end in range(stop, index + (stop - index + 1) // 2 - 1, -1):
+            token_start, token_end = token_spans[end - 1]
+            if _RE_SENTENCE_END.search(text[token_start: token_end]) is not None or \
+                    (end < len(token_spans) and "\n" in text[token_end: token_spans[end][0]]):
+                return end
+        return stop
+
+    def _get_window(self,
+                    token_spans: List[Tuple[int, int]],
+                    counts: List[int] or None,
+                    index: int,
+                    stop: int,
+                    start: int,
+                    end: int) -> Tuple[int, int, int, int]:
+        """
+        This method adds the context to the span of the sector, the context is shortened when the window does not fit
+        the model.
+        """
+        overlap = self._overlap if stop > index else 0
+        while True:
+            left, right = max(0, index - overlap), min(len(token_spans), stop + overlap)
+            if counts is None or overlap == 0 or counts[right] - counts[left] <= self._max_subwords - _SPECIAL_TOKENS:
+                break
+            overlap -= 1
+        return (start, end, token_spans[left][0] if left < index else start,
+                token_spans[right - 1][1] if right > stop else end)
+
+    def _get_prefix_counts(self, text: str, token_spans: List[Tuple[int, int]]) -> List[int]:
+        if self.subword_tokenize is None:
+            raise ValueError(f"The subword tokenizer is not set")
+        if len(self._subwords) > _SUBWORDS_CACHE_SIZE:
+            self._subwords.clear()
+        counts = [0]
+        for token_start, token_end in token_spans:
+            token = text[token_start: token_end]
+            if token not in self._subwords:
+                self._subwords[token] = max(1, len(self.subword_tokenize(token)))
+            counts.append(counts[-1] + self._subwords[token])
+        return counts
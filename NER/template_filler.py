@@ -0,0 +1,128 @@
+import copy
+import json
+from NER.markup_index import *
+from NER.section_index import *
+from typing import List, Dict, Any, Tuple, Iterable
+
+# Where the fields of a part of the template are searched: (block, group) -> (region, party, is in_text used),
+# the region 'head' is the text before the sections of the parties, the region 'party' is the sections of the party
+# in the SectionIndex, the fields of other parts are not filled
+_SECTIONS = {("main_information", None): ("head", None, True),
+             ("customer_information", None): ("party", "customer", False),
+             ("customer_information", "general_information"): ("party", "customer", False),
+             ("customer_information", "bank_details"): ("party", "customer", True),
+             ("customer_information", "contact_details"): ("party", "customer", False),
+             ("supplier_information", None): ("party", "supplier", False),
+             ("supplier_information", "general_information"): ("party", "supplier", False),
+             ("supplier_information", "bank_details"): ("party", "supplier", True),
+             ("supplier_information", "contact_details"): ("party", "supplier", False)}
+
+_TEMPLATES = {}
+
+
+class TemplateFiller:
+    """
+    :ru Скомпилированный шаблон, заполняющий структуру договора найденными в разметке блоками.
+    :en A compiled template that fills the structure of a contract with the blocks found in the markup.
+
+    The pattern (pattern_stract.json) is compiled once into a plan of searches grouped by the tag and the region,
+    a field takes the first block of its tag in its region, that contains its in_text for the 'str' fields of the
+    parts where in_text is used. The regions are taken from the SectionIndex of the document, so the parties may
+    come in any order. The plans are cached by the pattern, so 'compile' gives the same filler for the same
+    pattern of every document.
+    """
+
+    def __init__(self, pattern: Dict[str, Any], sections: Dict[Tuple[str, str or None], tuple] = None) -> None:
+        """
+        :param pattern: The pattern of the template
+        :param sections: Regions of the parts of the template, see '_SECTIONS'
+        """
+        if sections is None:
+            sections = _SECTIONS
+        self._plan = {}
+        for path, field in TemplateFiller._get_fields(pattern=pattern):
+            section = sections.get((path[0], path[1] if len(path) == 3 else None)) if len(path) in (2, 3) else None
+            if section is None or field["status"] != "used" or field["type"] not in ("int", "str"):
+                continue
+            region, party, is_in_text = section
+            in_string = field["in_text"] if is_in_text and field["type"] == "str" else None
+            self._plan.setdefault((MarkUpType(field["tag"]), region, party), []).append((path, field["type"],
+                                                                                         in_string))
+
+    @classmethod
+    def compile(cls, pattern: Dict[str, Any]) -> 'TemplateFiller':
+        """
+        :param pattern: The pattern of the template
+        :return: The cached filler of the pattern
+        """
+        key = json.dumps(pattern, sort_keys=True, ensure_ascii=False)
+        if key not in _TEMPLATES:
+            _TEMPLATES[key] = cls(pattern=pattern)
+        return _TEMPLATES[key]
+
+    @property
+    def tags(self) -> List[MarkUpType]:
+        return list(dict.fromkeys(block_type for block_type, _, _ in self._plan))
+
+    def match(self, text_markup: Iterable[MarkUpBlock], sections: SectionIndex) -> Dict[Tuple[str, ...], MarkUpBlock]:
+        """
+        This method finds the block of every field of the template by range queries in the regions of the fields.
+        :param text_markup: Markup of the contract
+        :param sections: Sections of the text of the contract
+        :return: The found blocks by the paths of their fields
+        """
+        tags = set(self.tags)
+        index = MarkUpIndex(block for block in text_markup if block.block_type in tags)
+        parties = sections.search(kind="party")
+        result = {}
+        for (block_type, region, party), fields in self._plan.items():
+            if region == "head":
+                spans = [(0, parties[0].start if len(parties) > 0 else sections.sections[-1].end)] \
+                    if len(sections) > 0 else []
+            else:
+                spans = sections.spans(kind=region, party=party)
+            found = [block for start, end in spans if end > start
+                     for block in index.search(block_type=block_type, start=start, stop=end - 1)]
+            for path, _, in_string in fields:
+                block = next((block for block in found if in_string is None or in_string in block.text), None)
+                if block is not None:
+                    result[path] = block
+        return result
+
+    def fill(self,
+             text_markup: Iterable[MarkUpBlock],
+             example: Dict[str, Any],
+             sections: SectionIndex) -> Dict[str, Any]:
+        """
+        This method fills a copy of the structure with the blocks of the fields, the 'int' fields get the digits of
+        the block.
+        :param text_markup: Markup of the contract
+        :param example: The empty structure (example_struct.json)
+        :param sections: Sections of the text of the contract
+        :return: The filled structure
+        """
+        types = {path: to_type for fields in self._plan.values() for path, to_type, _ in fields}
+        example = copy.deepcopy(example)
+        for path, block in self.match(text_markup=text_markup, sections=sections).items():
+            target = example
+            for key in path[:-1]:
+                target = target[key]
+            if types[path] == "int":
+                target[path[-1]] = int(TemplateFiller._clean_string(block.text))
+            else:
+                target[path[-1]] = block.text
+        return example
+
+    @staticmethod
+    def _get_fields(pattern: Dict[str, Any], path: tuple = ()) -> List[Tuple[tuple, Dict[str, Any]]]:
+        if "status" in pattern and isinstance(pattern["status"], str):
+            return [(path, pattern)]
+        fields = []
+        for key, value in pattern.items():
+            if isinstance(value, dict):
+                fields += TemplateFiller._get_fields(pattern=value, path=path + (key,))
+        return fields
+
+    @staticmethod
+    def _clean_string(text: str) -> str:
+        return ''.join(index for index in text if index.isdigit())
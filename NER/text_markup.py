@@ -1,19 +1,70 @@
 import re
 import json
 import time
-import torch
 import warnings
-import rutokenizer
+import contextlib
 from tqdm import tqdm
+from itertools import groupby
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from NER.markup import *
 from NER.mark_up_block import *
-from typing import List, Dict, Any
-from transformers import AutoTokenizer
-from deeppavlov import configs, build_model
-from natasha import NamesExtractor, AddrExtractor, DatesExtractor, MoneyExtractor, MorphVocab
+from NER.compact_markup import *
+from NER.markup_cache import *
+from NER.markup_tracer import *
+from NER.onnx_backend import *
+from NER.onnx_backend import _BACKENDS, _find_tokenizer
+from NER.sector_chunker import *
+from NER.sector_chunker import _SPECIAL_TOKENS
+from NER.workers import *
+from typing import List, Dict, Any, Iterator, Iterable, Match, Pattern, Tuple, Callable
 
 
 # pip install git+https://github.com/Koziev/rutokenizer
+# The model, the tokenizer and the Natasha extractors are imported and built when they are used for the first time,
+# so the import of the package and the requisites markup do not need them.
+
+# Requisites in the order in which they are looked for: a requisite found earlier wins over the later ones that overlap
+# it, the requisites of one block type are looked for in one pass. Every item is (fact name, block type, pattern),
+# the fact name is also the name of the group of the pattern.
+_REQUISITES = [("IKZ", MarkUpType.IKZ, r'(икз).?.?\d{36}(\s|\D)?'),
+               ("personalINN", MarkUpType.INN, r'(инн).?.?[0-9]{12}(\s|\D)'),
+               ("organizationINN", MarkUpType.INN, r'(инн).?.?[0-9]{10}(\s|\D)'),
+               ("KPP", MarkUpType.KPP, r'(кпп).?.?\d{9}(\s|\D)'),
+               ("OGRN", MarkUpType.OGRN, r'(огрн).?.?\d{13}(\s|\D)'),
+               ("OKPO", MarkUpType.OKPO, r'(окпо).?.?\d{8}(\s|\D)'),
+               ("OKTMO", MarkUpType.OKTMO, r'(октмо).?.?\d{9}(\s|\D)'),
+               ("OKATO", MarkUpType.OKATO, r'(окато).?.?\d{11}(\s|\D)'),
+               ("BIC", MarkUpType.BIC, r'(БИК).?.?\d{9}(\s|\D)?'),
+               ("phoneNumber", MarkUpType.PHONE,
+                r'(тел|тел.|телефон|факс|ф.).?.?'
+                r'(\+7|7|8)?[\s\-]?\(?[0-9]{3}\)?[\s\-]?[0-9]{3}[\s\-]?[0-9]{2}[\s\-]?[0-9]{2}(\s|\D)'),
+               ("SNILS", MarkUpType.SNILS, r'(снилс).?.?\d{3}-\d{3}-\d{3}\x20?-?\x20?\d{2}(\s|\D)'),
+               ("Email", MarkUpType.EMAIL, r'e?-?mail?.?.?[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}'),
+               ("Url", MarkUpType.URL, r'[a-zA-Z0-9][a-zA-Z0-9-]{1,61}[a-zA-Z0-9]\.[a-zA-Z]{2,6}')]
+_REQUISITE_TYPES = {name: block_type for name, block_type, _ in _REQUISITES}
+_RE_REQUISITE = {name: re.compile(f"(?P<{name}>{pattern})", re.IGNORECASE) for name, _, pattern in _REQUISITES}
+_RE_INN = re.compile("|".join(f"(?P<{name}>{pattern})" for name, block_type, pattern in _REQUISITES
+                              if block_type == MarkUpType.INN), re.IGNORECASE)
+# The patterns of the passes of the requisites markup in their order, one pass for every block type
+_RE_REQUISITE_PASSES = [re.compile("|".join(f"(?P<{name}>{pattern})" for name, block_type, pattern in _REQUISITES
+                                            if block_type == pass_type), re.IGNORECASE)
+                        for pass_type in dict.fromkeys(block_type for _, block_type, _ in _REQUISITES)]
+# Index of the pass of every requisite
+_REQUISITE_PASS = {name: list(dict.fromkeys(_REQUISITE_TYPES.values())).index(block_type)
+                   for name, block_type, _ in _REQUISITES}
+# All requisites in one pattern in the order of '_REQUISITES'. The lookahead holds the first letters of the requisites,
+# it lets the regex engine skip at once the places where none of them starts, without it the alternation is scanned
+# slower than all passes apart
+_RE_REQUISITES = re.compile("(?=[икобтфс\\-a-z0-9])(?:" + "|".join(f"(?P<{name}>{pattern})"
+                                                                   for name, _, pattern in _REQUISITES) + ")",
+                            re.IGNORECASE)
+# A place that no requisite crosses: a requisite takes the end of a line only as its last letter or between the digits
+# of a phone, so the passes mark up the text after such a place as if it were a text of its own
+_RE_REQUISITE_CUT = re.compile(r"\n(?![(0-9])")
+# The requisites of the passes before every pass in one pattern, None for the first pass
+_RE_REQUISITE_PRIORS = [re.compile("|".join(f"(?P<{name}>{pattern})" for name, _, pattern in _REQUISITES
+                                            if _REQUISITE_PASS[name] < index), re.IGNORECASE) if index > 0 else None
+                        for index in range(len(_RE_REQUISITE_PASSES))]
 
 
 class TextMarkUp:
@@ -23,21 +74,169 @@ class TextMarkUp:
 
     """
 
-    def __init__(self, is_bert: bool, is_pro_bert: bool = False, download: bool = False) -> None:
-        if is_bert:
-            if is_pro_bert:
-                self._model = configs.ner.ner_ontonotes_bert_mult
-            else:
-                self._model = configs.ner.ner_rus_bert
-            self._ner = build_model(self._model, download=download)
+    def __init__(self,
+                 is_bert: bool,
+                 is_pro_bert: bool = False,
+                 download: bool = False,
+                 batch_size: int = 16,
+                 batch_tokens: int = None,
+                 cache: MarkUpCache = None,
+                 tracer: MarkUpTracer = None,
+                 progress: bool = True,
+                 backend: str = "torch",
+                 onnx_path: str = None,
+                 num_threads: int = None,
+                 num_interop_threads: int = None,
+                 chunker: SectorChunker = None) -> None:
+        """
+        :param is_bert: Whether to search the named entities by the model, otherwise only the requisites are searched
+        :param is_pro_bert: Whether to use ner_ontonotes_bert_mult instead of ner_rus_bert
+        :param download: Whether to download the model
+        :param batch_size: Count of sectors in one model call
+        :param batch_tokens: The greatest count of subwords with the padding in one model call, the sectors are
+         measured by the tokenizer of the model and packed by their length; by default the sectors go to the model
+         in their order
+        :param cache: Cache of the markup of the sectors
+        :param tracer: Tracer of the stages of the markup
+        :param progress: Whether to show the progress of the model
+        :param backend: Backend of the model: 'torch', 'onnx' or 'onnx-int8'
+        :param onnx_path: Path of the onnx copy of the model, by default in the DeepPavlov directory of the user
+        :param num_threads: Count of the intra-op threads of the model, see get_worker_threads, by default the one of
+         torch or onnxruntime
+        :param num_interop_threads: Count of the inter-op threads of the model
+        :param chunker: Splitter of the texts into sectors, by default every 200 tokens without overlap
+        """
+        if batch_size <= 0:
+            raise ValueError(f"Batch size should be grater then zero")
+        if batch_tokens is not None and batch_tokens <= 0:
+            raise ValueError(f"Batch tokens should be grater then zero")
+        if num_threads is not None and num_threads <= 0:
+            raise ValueError(f"Threads count should be grater then zero")
+        if num_interop_threads is not None and num_interop_threads <= 0:
+            raise ValueError(f"Inter-op threads count should be grater then zero")
+        if backend not in _BACKENDS:
+            raise ValueError(f"Backend should be one of {_BACKENDS}, but got '{backend}'")
         self._is_bert = is_bert
-        self._morph_vocab = MorphVocab()
-        self._names_extractor = NamesExtractor(self._morph_vocab)
-        self._addr_extractor = AddrExtractor(self._morph_vocab)
-        self._dates_extractor = DatesExtractor(self._morph_vocab)
-        self._money_extractor = MoneyExtractor(self._morph_vocab)
-        self._tokenizer = rutokenizer.Tokenizer()
-        self._tokenizer.load()
+        self._model_name = "ner_ontonotes_bert_mult" if is_pro_bert else "ner_rus_bert"
+        self._download = download
+        self._backend = backend
+        self._onnx_path = onnx_path if onnx_path is not None else get_onnx_path(model_name=self._model_name)
+        # The backends and the quantization may tag a little differently, so they do not share the cached markup
+        self._cache_model = f"{self._model_name}:{backend}"
+        self._batch_size = batch_size
+        self._batch_tokens = batch_tokens
+        self._num_threads = num_threads
+        self._num_interop_threads = num_interop_threads
+        self._cache = cache
+        self._tracer = tracer if tracer is not None else MarkUpTracer()
+        self._progress = progress
+        self._chunker = chunker if chunker is not None else SectorChunker()
+        self._ner = None
+        self._tokenizer = None
+        self._morph_vocab = None
+        self._names_extractor = None
+        self._addr_extractor = None
+        self._dates_extractor = None
+        self._money_extractor = None
+
+    def load(self) -> 'TextMarkUp':
+        """
+        This method builds at once the components witch get_markup uses: the model and the tokenizer, when the model
+        is used. Otherwise they are built by the first markup.
+        """
+        if self._is_bert:
+            _ = self.ner_model
+            _ = self.tokenizer
+        return self
+
+    @property
+    def ner_model(self):
+        """
+        The model takes a list of texts and gives (tokens, tags), it may be replaced, for example with a stub.
+        With the 'onnx' and 'onnx-int8' backends the transformer of the model runs in onnxruntime, it is exported to
+        'onnx_path' by the first build. The thread counts of torch are set for the whole process before the build.
+        """
+        if self._ner is None:
+            self._set_threads()
+            from deeppavlov import configs, build_model
+            self._ner = build_model(getattr(configs.ner, self._model_name), download=self._download)
+            if self._backend != "torch":
+                attach_onnx_backend(ner_model=self._ner, path=self._onnx_path, quantize=self._backend == "onnx-int8",
+                                    session_options=get_session_options(num_threads=self._num_threads,
+                                                                        num_interop_threads=self._num_interop_threads))
+        return self._ner
+
+    @ner_model.setter
+    def ner_model(self, ner_model) -> None:
+        self._ner = ner_model
+
+    def _set_threads(self) -> None:
+        if self._num_threads is None and self._num_interop_threads is None:
+            return
+        import torch
+        if self._num_threads is not None:
+            torch.set_num_threads(self._num_threads)
+        if self._num_interop_threads is not None:
+            try:
+                torch.set_num_interop_threads(self._num_interop_threads)
+            except RuntimeError:
+                warnings.warn(f"The inter-op threads of torch can be set only once and before any parallel work, "
+                              f"they stay {torch.get_num_interop_threads()}")
+
+    @staticmethod
+    def _inference_mode():
+        """
+        The guard of the calls of the model: torch inference mode, or no_grad in the old versions of torch, nothing
+        when torch is not installed, for example with a stub of the model.
+        """
+        try:
+            import torch
+        except ImportError:
+            return contextlib.nullcontext()
+        return torch.inference_mode() if hasattr(torch, "inference_mode") else torch.no_grad()
+
+    @property
+    def tokenizer(self):
+        if self._tokenizer is None:
+            import rutokenizer
+            self._tokenizer = rutokenizer.Tokenizer()
+            self._tokenizer.load()
+        return self._tokenizer
+
+    @property
+    def morph_vocab(self):
+        if self._morph_vocab is None:
+            from natasha import MorphVocab
+            self._morph_vocab = MorphVocab()
+        return self._morph_vocab
+
+    @property
+    def names_extractor(self):
+        if self._names_extractor is None:
+            from natasha import NamesExtractor
+            self._names_extractor = NamesExtractor(self.morph_vocab)
+        return self._names_extractor
+
+    @property
+    def addr_extractor(self):
+        if self._addr_extractor is None:
+            from natasha import AddrExtractor
+            self._addr_extractor = AddrExtractor(self.morph_vocab)
+        return self._addr_extractor
+
+    @property
+    def dates_extractor(self):
+        if self._dates_extractor is None:
+            from natasha import DatesExtractor
+            self._dates_extractor = DatesExtractor(self.morph_vocab)
+        return self._dates_extractor
+
+    @property
+    def money_extractor(self):
+        if self._money_extractor is None:
+            from natasha import MoneyExtractor
+            self._money_extractor = MoneyExtractor(self.morph_vocab)
+        return self._money_extractor
 
     def get_markup(self, text: str) -> List[MarkUpBlock]:
         """
@@ -49,31 +248,323 @@ class TextMarkUp:
         :param text:en A string that needs markup.
         :type text: str
         """
+        return TextMarkUp._finish_markup(text_markup=self._get_base_markups(texts=[text])[0], tracer=self._tracer)
+
+    def get_markup_many(self, texts: List[str], workers: int = None) -> List[List[MarkUpBlock]]:
+        """
+        :ru Этот метод размечает несколько текстов и выдает разметку в порядке текстов.
+        :en This method marks up several texts and gives the markups in the order of the texts.
+
+        :param texts: Strings that need markup.
+        :param workers: Count of processes for the requisites stage, see iter_markup_many.
+        """
+        text_markups = [[] for _ in range(len(texts))]
+        for index, text_markup in self.iter_markup_many(texts=texts, workers=workers):
+            text_markups[index] = text_markup
+        return text_markups
+
+    def iter_markup_many(self, texts: List[str], workers: int = None) -> Iterator[Tuple[int, List[MarkUpBlock]]]:
+        """
+        :ru Этот метод размечает несколько текстов и выдает пары (номер текста, разметка) по мере готовности.
+        :en This method marks up several texts and yields pairs (index of the text, markup) as they are completed.
+
+        The sectors of all texts go to the model in shared batches in this process, then the requisites stage of
+        every text runs in a pool of processes, where it is not traced.
+        :param texts: Strings that need markup.
+        :param workers: Count of processes, by default the count of cores, 0 or 1 runs everything in this process.
+        """
+        base_markups = self._get_base_markups(texts=texts)
+        if workers is not None and workers <= 1:
+            for index, text_markup in enumerate(base_markups):
+                yield index, TextMarkUp._finish_markup(text_markup=text_markup, tracer=self._tracer)
+            return
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(TextMarkUp._finish_markup, text_markup): index
+                       for index, text_markup in enumerate(base_markups)}
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+
+    def iter_markup(self, chunks: Iterable[str], border: int = None) -> Iterator[MarkUpBlock]:
+        """
+        :ru Этот метод размечает текст, поступающий частями, и выдает готовые блоки по мере обработки секторов.
+        :en This method marks up a text coming in chunks and yields the finished blocks as the sectors are processed.
+
+        Only the unfinished sector and the last blocks, that may still be joined with the next ones, are kept in
+        memory. With the model the blocks are the same as get_markup gives for the whole text. Without the model
+        the unmarked text is cut at the ends of lines and comes in blocks of whole lines.
+        :param chunks: Parts of the text in their order, for example an opened file.
+        :param border: Count of tokens in one sector, by default the one of the chunker.
+        """
+        if isinstance(chunks, str):
+            chunks = [chunks]
+        if not self._is_bert:
+            yield from self._iter_lines_markup(chunks=chunks)
+            return
+        text_markup = TextMarkUp._join_stream(text_markup=self._iter_bert_markup(chunks=chunks, border=border))
+        text_markup = ((base_block.start, TextMarkUp.get_requisites_markup(text_markup=[base_block]))
+                       for base_block in text_markup)
+        yield from TextMarkUp._join_stream(text_markup=text_markup)
+
+    def _iter_bert_markup(self, chunks: Iterable[str], border: int) -> Iterator[Tuple[int, List[MarkUpBlock]]]:
+        """
+        This method collects the chunks until they make whole sectors, and yields the start of every sector with its
+        named entities with absolute offsets. A sector is whole when some token follows it and its context, so a word
+        cut by the end of a chunk is never sent to the model. With overlap the text of the last sector is kept for
+        the context of the next one.
+        """
+        buffer = ""
+        offset = 0
+        begin = 0
+        for chunk in chunks:
+            buffer += chunk
+            windows = self._get_sector_windows(text=buffer, border=border, start=begin, final=False)
+            if len(windows) == 0:
+                continue
+            yield from self._iter_windows_markup(text=buffer, windows=windows, offset=offset)
+            keep = windows[-1][1] if self._chunker.overlap == 0 else windows[-1][2]
+            buffer = buffer[keep:]
+            offset += keep
+            begin = windows[-1][1] - keep
+        yield from self._iter_windows_markup(
+            text=buffer, windows=self._get_sector_windows(text=buffer, border=border, start=begin), offset=offset)
+
+    def _iter_windows_markup(self,
+                             text: str,
+                             windows: List[Tuple[int, int, int, int]],
+                             offset: int) -> Iterator[Tuple[int, List[MarkUpBlock]]]:
+        """
+        :return: Pairs (start of the sector, markup of the sector) for the sectors of the text in their order,
+         see _get_window_sectors
+        """
+        yield from self._get_sectors_markup(sectors=[
+            (span[0], window_text, start_index, span) for _, window_text, start_index, span in
+            TextMarkUp._get_window_sectors(key=None, text=text, windows=windows, offset=offset)])
+
+    def _iter_lines_markup(self, chunks: Iterable[str]) -> Iterator[MarkUpBlock]:
+        """
+        This method cuts the chunks at the ends of lines and yields the requisites markup of every piece of lines.
+        """
+        buffer = ""
+        offset = 0
+        for chunk in chunks:
+            buffer += chunk
+            cut = buffer.rfind("\n") + 1
+            if cut > 0:
+                yield from TextMarkUp._finish_markup(text_markup=[MarkUpBlock(text=buffer[:cut],
+                                                                              block_type=MarkUpType.NOTHING,
+                                                                              start=offset,
+                                                                              end=offset + cut)],
+                                                            tracer=self._tracer)
+                buffer = buffer[cut:]
+                offset += cut
+        if len(buffer) > 0:
+            yield from TextMarkUp._finish_markup(text_markup=[MarkUpBlock(text=buffer,
+                                                                          block_type=MarkUpType.NOTHING,
+                                                                          start=offset,
+                                                                          end=offset + len(buffer))],
+                                                        tracer=self._tracer)
+
+    @staticmethod
+    def _join_stream(text_markup: Iterable[Tuple[int, List[MarkUpBlock]]]) -> Iterator[MarkUpBlock]:
+        """
+        This generator sorts the blocks by start, removes empty blocks and joins the neighbouring blocks of one type,
+        like rebuild_markup does with delete_empty and join_similar. A block is yielded as soon as a block of another
+        type follows it in the sorted markup.
+        :param text_markup: Pairs (start, blocks), no block of the pair or of the pairs after it starts before start
+        """
+        text_markup = (block for block in TextMarkUp._sort_stream(text_markup=text_markup) if len(block.text) > 0)
+        for _, blocks in groupby(text_markup, key=lambda x: x.block_type):
+            yield from TextMarkUp.rebuild_markup(text_markup=list(blocks), join_similar=True)
+
+    @staticmethod
+    def _sort_stream(text_markup: Iterable[Tuple[int, List[MarkUpBlock]]]) -> Iterator[MarkUpBlock]:
+        """
+        This generator gives the blocks in the order the stable sort by start of all of them gives, like the one of
+        rebuild_markup, when the blocks, for example the ones of the model at the borders of the sectors, overlap or
+        come out of order. Only the blocks that may still be passed by the next ones are kept.
+        :param text_markup: Pairs (start, blocks), no block of the pair or of the pairs after it starts before start
+        """
+        buffer = []
+        for start, blocks in text_markup:
+            buffer += blocks
+            if any(buffer[index].start > buffer[index + 1].start for index in range(len(buffer) - 1)):
+                buffer.sort(key=lambda x: x.start)
+            ready = 0
+            while ready < len(buffer) and buffer[ready].start <= start:
+                ready += 1
+            yield from buffer[:ready]
+            buffer = buffer[ready:]
+        yield from buffer
+
+    def _get_base_markups(self, texts: List[str]) -> List[List[MarkUpBlock]]:
+        """
+        This method gives the markup of the texts before the requisites stage: the named entities found by the
+        model or one unmarked block per text.
+        :param texts: Strings that need markup.
+        :return: List[List[MarkUpBlock]]
+        """
         if self._is_bert:
-            start_index = 0
-            text_markup = []
-            text_sector = self._prepear_text_to_bert(text=text, border=200)
-            for sector in tqdm(text_sector, desc="Getting Named Entities..."):
-                markup = self.get_bert_markup(text=sector, start_index=start_index)
-                text_markup += markup
-                start_index = markup[-1].end
-            text_markup = self.rebuild_markup(text_markup=text_markup, delete_empty=True, join_similar=True)
-        else:
-            text_markup = [MarkUpBlock(text=text, block_type=MarkUpType.NOTHING, start=0, end=len(text))]
-        text_markup = self.rebuild_markup(self.get_ikz_markup(text_markup=text_markup))
-        text_markup = self.rebuild_markup(self.get_inn_markup(text_markup=text_markup))
-        text_markup = self.rebuild_markup(self.get_kpp_markup(text_markup=text_markup))
-        text_markup = self.rebuild_markup(self.get_ogrn_markup(text_markup=text_markup))
-        text_markup = self.rebuild_markup(self.get_okpo_markup(text_markup=text_markup))
-        text_markup = self.rebuild_markup(self.get_oktmo_markup(text_markup=text_markup))
-        text_markup = self.rebuild_markup(self.get_okato_markup(text_markup=text_markup))
-        text_markup = self.rebuild_markup(self.get_bic_markup(text_markup=text_markup))
-        text_markup = self.rebuild_markup(self.get_phone_markup(text_markup=text_markup))
-        text_markup = self.rebuild_markup(self.get_snils_markup(text_markup=text_markup))
-        text_markup = self.rebuild_markup(self.get_emails_markup(text_markup=text_markup))
-        text_markup = self.rebuild_markup(self.get_urls_markup(text_markup=text_markup))
+            base_markups = []
+            for text_markup in self.get_bert_markups(texts=texts):
+                with self._tracer.stage("rebuild_markup:bert", blocks_in=len(text_markup)) as record:
+                    text_markup = self.rebuild_markup(text_markup=text_markup, delete_empty=True, join_similar=True)
+                    record.blocks_out = len(text_markup)
+                base_markups.append(text_markup)
+            return base_markups
+        return [[MarkUpBlock(text=text, block_type=MarkUpType.NOTHING, start=0, end=len(text))] for text in texts]
+
+    @staticmethod
+    def _finish_markup(text_markup: List[MarkUpBlock], tracer: MarkUpTracer = None) -> List[MarkUpBlock]:
+        """
+        This method places the requisites into the pre-marked text and reformats the result.
+        :param text_markup: Pre-marked text
+        :param tracer: The tracer of the stages, nothing is traced by default
+        :return: List[MarkUpBlock]
+        """
+        if tracer is None:
+            tracer = MarkUpTracer()
+        with tracer.stage("requisites", blocks_in=len(text_markup)) as record:
+            text_markup = TextMarkUp.get_requisites_markup(text_markup=text_markup)
+            record.blocks_out = len(text_markup)
+            record.count_matches(text_markup=text_markup, block_types=_REQUISITE_TYPES.values())
         # text_markup = self.rebuild_markup(self.get_date_markup(text_markup=text_markup))
-        return self.rebuild_markup(text_markup=text_markup, delete_empty=True, join_similar=True)
+        with tracer.stage("rebuild_markup:final", blocks_in=len(text_markup)) as record:
+            text_markup = TextMarkUp.rebuild_markup(text_markup=text_markup, delete_empty=True, join_similar=True)
+            record.blocks_out = len(text_markup)
+        return text_markup
+
+    @property
+    def is_bert(self) -> bool:
+        return self._is_bert
+
+    @property
+    def backend(self) -> str:
+        return self._backend
+
+    @property
+    def tracer(self) -> MarkUpTracer:
+        return self._tracer
+
+    @property
+    def cache(self) -> MarkUpCache or None:
+        return self._cache
+
+    @property
+    def chunker(self) -> SectorChunker:
+        return self._chunker
+
+    def get_compact_markup(self, text: str) -> CompactMarkUp:
+        """
+        :ru Этот метод размечает текст так же, как get_markup, но хранит разметку в компактном виде.
+        :en This method marks up the text like get_markup does, but keeps the markup in the compact form.
+
+        :param text: A string that needs markup.
+        :type text: str
+        """
+        return CompactMarkUp.from_blocks(text_markup=self.get_markup(text=text), source=text)
+
+    def get_bert_markups(self, texts: List[str], batch_size: int = None) -> List[List[MarkUpBlock]]:
+        """
+        This method splits every text into sectors and sends the sectors of all texts to the model in batches,
+        then maps the found tokens back to the offsets of their own text.
+        :param texts: The texts witch we need tu markup
+        :param batch_size: Count of sectors in one model call, by default the one set in the constructor
+        :return: List[List[MarkUpBlock]] in the order of the texts
+        """
+        sectors = []
+        for index, text in enumerate(texts):
+            sectors += TextMarkUp._get_window_sectors(key=index, text=text, windows=self._get_sector_windows(text=text))
+        text_markups = [[] for _ in range(len(texts))]
+        for index, text_markup in self._get_sectors_markup(sectors=sectors, batch_size=batch_size):
+            text_markups[index] += text_markup
+        return text_markups
+
+    def _get_sectors_markup(self,
+                            sectors: List[Tuple[Any, ...]],
+                            batch_size: int = None,
+                            cached: bool = True) -> Iterator[Tuple[Any, List[MarkUpBlock]]]:
+        """
+        This method sends the sectors to the model in batches and yields the markup of every sector with its key.
+        Sectors without any text are skipped. The markup of a sector with context is cut back to the span of the sector.
+        With 'batch_tokens' the batches are made of the sectors of similar length, so the sectors are sent out of
+        their order, but they are still yielded in it.
+        :param sectors: Items (key, text of the sector, offset of the sector) or (key, text of the window of the sector,
+         offset of the window, (start, end) of the sector), see _get_window_sectors
+        :param batch_size: Count of sectors in one model call, by default the one set in the constructor
+        :param cached: Whether the sectors are looked up in the cache and stored in it, when the marker has a cache
+        :return: Iterator[Tuple[Any, List[MarkUpBlock]]] in the order of the sectors
+        """
+        if batch_size is None:
+            batch_size = self._batch_size
+        if batch_size <= 0:
+            raise ValueError(f"Batch size should be grater then zero")
+        sectors = [sector for sector in sectors if len(sector[1].strip()) > 0]
+        sectors_markup = [None] * len(sectors)
+        if self._cache is not None and cached:
+            sectors_markup = [self._cache.get(model=self._cache_model, text=sector[1], start_index=sector[2])
+                              for sector in sectors]
+        missing = [index for index in range(len(sectors)) if sectors_markup[index] is None]
+        batches = [[missing[position] for position in batch] for batch in
+                   self._get_batches(texts=[sectors[index][1] for index in missing], batch_size=batch_size)]
+        progress = tqdm(total=len(missing), desc="Getting Named Entities...", disable=not self._progress)
+        batch_index = 0
+        for index, sector in enumerate(sectors):
+            while sectors_markup[index] is None:
+                batch = batches[batch_index]
+                with self._tracer.stage("bert", blocks_in=len(batch)) as record:
+                    with self._inference_mode():
+                        tokens, tags = self.ner_model([sectors[sector_index][1] for sector_index in batch])
+                    for sector_index, sector_tokens, sector_tags in zip(batch, tokens, tags):
+                        _, sector_text, start_index = sectors[sector_index][:3]
+                        sectors_markup[sector_index] = self._tags_to_markup(text=sector_text, tokens=sector_tokens,
+                                                                            tags=sector_tags, start_index=start_index)
+                        record.blocks_out += len(sectors_markup[sector_index])
+                        record.count_matches(text_markup=sectors_markup[sector_index])
+                        if self._cache is not None and cached:
+                            self._cache.put(model=self._cache_model, text=sector_text,
+                                            text_markup=sectors_markup[sector_index], start_index=start_index)
+                batch_index += 1
+                progress.update(len(batch))
+            if len(sector) > 3:
+                yield sector[0], TextMarkUp._clip_markup(text_markup=sectors_markup[index], text=sector[1],
+                                                         start_index=sector[2], start=sector[3][0], end=sector[3][1])
+            else:
+                yield sector[0], sectors_markup[index]
+            sectors_markup[index] = None
+        progress.close()
+
+    def _get_batches(self, texts: List[str], batch_size: int) -> List[List[int]]:
+        """
+        This method groups the texts into the batches of the model. Without 'batch_tokens' the batches have
+        'batch_size' texts in their order. Otherwise the texts are sorted by their count of subwords and a batch takes
+        the next texts while it has no more than 'batch_size' texts and no more than 'batch_tokens' subwords, when all
+        texts are padded to the longest one, so the model pads the short texts less.
+        :param texts: Texts of the sectors
+        :param batch_size: Count of sectors in one model call
+        :return: Lists of the indexes of the texts
+        """
+        if self._batch_tokens is None:
+            return [list(range(start, min(len(texts), start + batch_size)))
+                    for start in range(0, len(texts), batch_size)]
+        with self._tracer.stage("packing", blocks_in=len(texts)) as record:
+            subword_tokenize = self._get_subword_tokenize()
+            lengths = [len(subword_tokenize(text)) + _SPECIAL_TOKENS for text in texts]
+            batches = []
+            for index in sorted(range(len(texts)), key=lambda x: lengths[x]):
+                if len(batches) == 0 or len(batches[-1]) >= batch_size or \
+                        lengths[index] * (len(batches[-1]) + 1) > self._batch_tokens:
+                    batches.append([])
+                batches[-1].append(index)
+            record.blocks_out = len(batches)
+        return batches
+
+    def _get_subword_tokenize(self) -> Callable[[str], List[str]]:
+        """
+        :return: The subword tokenizer of the chunker, by default it is the tokenizer of the model
+        """
+        if self._chunker.subword_tokenize is None:
+            self._chunker.subword_tokenize = _find_tokenizer(ner_model=self.ner_model).tokenize
+        return self._chunker.subword_tokenize
 
     def get_bert_markup(self, text: str, start_index: int = 0) -> List[MarkUpBlock]:
         """
@@ -81,27 +572,94 @@ class TextMarkUp:
         :param text: The text witch we need tu markup
         :return: List[Dict[str, dict]]
         """
+        with self._inference_mode():
+            tokens, tags = self.ner_model([text])
+        return self._tags_to_markup(text=text, tokens=tokens[0], tags=tags[0], start_index=start_index)
+
+    @staticmethod
+    def _tags_to_markup(text: str, tokens: List[str], tags: List[str], start_index: int = 0) -> List[MarkUpBlock]:
+        """
+        This method turns the tokens and tags predicted by the model for the text into markup blocks.
+        :param text: The text witch was sent to the model
+        :param tokens: Tokens of the text
+        :param tags: Tags of the tokens
+        :param start_index: Offset of the text in the whole document
+        :return: List[MarkUpBlock]
+        """
         last_block_type = None
         text_markup = []
-        tokens, tags = self._ner([text])
-        for tok, tag in zip(tokens[0], tags[0]):
-            gap = text[:text.index(tok)]
-            text = text[text.index(tok) + len(tok):]
+        block_start = 0
+        cursor = 0
+        for (start, end), tag in zip(TextMarkUp._align_tokens(text=text, tokens=tokens), tags):
             block_type = MarkUpType(str(tag).replace("B-", "").replace("I-", ""))
             if tag.startswith("O") or (block_type != last_block_type and
                                        (not tag.startswith("I-") or (len(text_markup) == 0 and tag.startswith("I-")))):
-                text_markup.append(MarkUpBlock(text=(gap + tok).strip(),
+                block_start = cursor
+                text_markup.append(MarkUpBlock(text=text[block_start: end].strip(),
                                                block_type=block_type,
-                                               start=start_index,
-                                               end=start_index + len(gap) + len(tok)))
+                                               start=start_index + block_start,
+                                               end=start_index + end))
             else:
-                text_markup[-1].text += gap + tok
-                text_markup[-1].text = text_markup[-1].text.strip()
-                text_markup[-1].end += len(gap) + len(tok)
-            start_index += len(gap) + len(tok)
+                text_markup[-1].text = text[block_start: end].strip()
+                text_markup[-1].end = start_index + end
+            cursor = end
             last_block_type = block_type
         return text_markup
 
+    @staticmethod
+    def _align_tokens(text: str, tokens: List[str]) -> List[Tuple[int, int]]:
+        """
+        This method walks the text once and finds the (start, end) span of every token, the tokens should follow
+        each other in the text.
+        :param text: The text witch was tokenized
+        :param tokens: Tokens of the text
+        :return: List[Tuple[int, int]]
+        """
+        spans = []
+        cursor = 0
+        for token in tokens:
+            start = text.index(token, cursor)
+            cursor = start + len(token)
+            spans.append((start, cursor))
+        return spans
+
+    @staticmethod
+    def get_requisites_markup(text_markup: List[MarkUpBlock]) -> List[MarkUpBlock]:
+        """
+        This method receives the pre-marked text as input and places all requisites (IKZ, INN, KPP, OGRN, OKPO,
+         OKTMO, OKATO, BIC, phones, SNILS, emails and urls) from the pieces that have not yet been marked up.
+         Every piece is scanned once by the pattern of all requisites, and the requisites are found as by the
+         separate get_*_markup passes in the order of '_REQUISITES', every kind only in the gaps left by the kinds
+         before it.
+        :param text_markup: Pre-marked text
+        :return: List[MarkUpBlock]
+        """
+        result_markup = []
+        for block in text_markup:
+            if block.block_type != MarkUpType.NOTHING:
+                result_markup.append(block)
+                continue
+            left_bounce = 0
+            for requisite in TextMarkUp._requisites_extractor(text=block.text):
+                start, stop = requisite["start"], min(requisite["stop"], len(block.text))
+                if start > left_bounce:
+                    result_markup.append(MarkUpBlock(text=block.text[left_bounce: start],
+                                                     block_type=MarkUpType.NOTHING,
+                                                     start=block.start + left_bounce,
+                                                     end=block.start + start))
+                result_markup.append(MarkUpBlock(text=block.text[start: stop],
+                                                 block_type=_REQUISITE_TYPES[next(iter(requisite["fact"]))],
+                                                 start=block.start + start,
+                                                 end=block.start + stop,
+                                                 attachments=requisite["fact"]))
+                left_bounce = stop
+            if len(block.text) > left_bounce:
+                result_markup.append(MarkUpBlock(text=block.text[left_bounce:],
+                                                 block_type=MarkUpType.NOTHING,
+                                                 start=block.start + left_bounce,
+                                                 end=block.end))
+        return result_markup
+
     def get_date_markup(self, text_markup: List[MarkUpBlock]) -> List[MarkUpBlock]:
         """
         This class receives the pre-marked text as input and places the dates from the pieces
@@ -112,7 +670,7 @@ class TextMarkUp:
         result_markup = []
         for tm in range(len(text_markup)):
             if text_markup[tm].block_type == MarkUpType.NOTHING:
-                dates = self._dates_extractor(text_markup[tm].text)
+                dates = self.dates_extractor(text_markup[tm].text)
                 increment = text_markup[tm].start
                 left_bounce = 0
                 for date in dates:
@@ -145,6 +703,10 @@ class TextMarkUp:
                 result_markup.append(text_markup[tm])
         return result_markup
 
+    # The separate passes of the requisites from get_phone_markup to get_urls_markup are the baseline only: get_markup
+    # and the other markups find all requisites by get_requisites_markup. They are kept for benchmark.py, witch times
+    # the one pass against them and checks that both find the same requisites, and for the old callers.
+
     def get_phone_markup(self, text_markup: List[MarkUpBlock]) -> List[MarkUpBlock]:
         """
         This class receives the pre-marked text as input and places the phones from the pieces
@@ -159,19 +721,19 @@ class TextMarkUp:
                 increment = text_markup[tm].start
                 left_bounce = 0
                 for phone in phones:
-                    if phone["start"] > 0:
+                    if phone["start"] > left_bounce:
                         result_markup.append(MarkUpBlock(text=text_markup[tm].text[left_bounce: phone["start"]],
                                                          block_type=MarkUpType.NOTHING,
                                                          start=increment + left_bounce,
-                                                         end=increment + left_bounce + phone["start"]))
+                                                         end=increment + phone["start"]))
                     markup = {}
                     if phone["fact"]["phoneNumber"] is not None:
                         markup["phoneNumber"] = phone["fact"]["phoneNumber"]
                     result_markup.append(MarkUpBlock(text=text_markup[tm].text[phone["start"]:
                                                                                phone["stop"]],
                                                      block_type=MarkUpType.PHONE,
-                                                     start=increment + left_bounce + phone["start"],
-                                                     end=increment + left_bounce + phone["stop"],
+                                                     start=increment + phone["start"],
+                                                     end=increment + phone["stop"],
                                                      attachments=markup))
                     left_bounce = phone["stop"]
                 if text_markup[tm].end - (increment + left_bounce) > 0:
@@ -198,11 +760,11 @@ class TextMarkUp:
                 increment = text_markup[tm].start
                 left_bounce = 0
                 for inn in inns:
-                    if inn["start"] > 0:
+                    if inn["start"] > left_bounce:
                         result_markup.append(MarkUpBlock(text=text_markup[tm].text[left_bounce: inn["start"]],
                                                          block_type=MarkUpType.NOTHING,
                                                          start=increment + left_bounce,
-                                                         end=increment + left_bounce + inn["start"]))
+                                                         end=increment + inn["start"]))
                     markup = {}
                     if "organizationINN" in inn["fact"]:
                         markup["organizationINN"] = inn["fact"]["organizationINN"]
@@ -211,8 +773,8 @@ class TextMarkUp:
                     result_markup.append(MarkUpBlock(text=text_markup[tm].text[inn["start"]:
                                                                                inn["stop"]],
                                                      block_type=MarkUpType.INN,
-                                                     start=increment + left_bounce + inn["start"],
-                                                     end=increment + left_bounce + inn["stop"],
+                                                     start=increment + inn["start"],
+                                                     end=increment + inn["stop"],
                                                      attachments=markup))
                     left_bounce = inn["stop"]
                 if text_markup[tm].end - (increment + left_bounce) > 0:
@@ -239,19 +801,19 @@ class TextMarkUp:
                 increment = text_markup[tm].start
                 left_bounce = 0
                 for kpp in kpps:
-                    if kpp["start"] > 0:
+                    if kpp["start"] > left_bounce:
                         result_markup.append(MarkUpBlock(text=text_markup[tm].text[left_bounce: kpp["start"]],
                                                          block_type=MarkUpType.NOTHING,
                                                          start=increment + left_bounce,
-                                                         end=increment + left_bounce + kpp["start"]))
+                                                         end=increment + kpp["start"]))
                     markup = {}
                     if "KPP" in kpp["fact"]:
                         markup["KPP"] = kpp["fact"]["KPP"]
                     result_markup.append(MarkUpBlock(text=text_markup[tm].text[kpp["start"]:
                                                                                kpp["stop"]],
                                                      block_type=MarkUpType.KPP,
-                                                     start=increment + left_bounce + kpp["start"],
-                                                     end=increment + left_bounce + kpp["stop"],
+                                                     start=increment + kpp["start"],
+                                                     end=increment + kpp["stop"],
                                                      attachments=markup))
                     left_bounce = kpp["stop"]
                 if text_markup[tm].end - (increment + left_bounce) > 0:
@@ -278,19 +840,19 @@ class TextMarkUp:
                 increment = text_markup[tm].start
                 left_bounce = 0
                 for ikz in ikzs:
-                    if ikz["start"] > 0:
+                    if ikz["start"] > left_bounce:
                         result_markup.append(MarkUpBlock(text=text_markup[tm].text[left_bounce: ikz["start"]],
                                                          block_type=MarkUpType.NOTHING,
                                                          start=increment + left_bounce,
-                                                         end=increment + left_bounce + ikz["start"]))
+                                                         end=increment + ikz["start"]))
                     markup = {}
                     if "IKZ" in ikz["fact"]:
                         markup["IKZ"] = ikz["fact"]["IKZ"]
                     result_markup.append(MarkUpBlock(text=text_markup[tm].text[ikz["start"]:
                                                                                ikz["stop"]],
                                                      block_type=MarkUpType.IKZ,
-                                                     start=increment + left_bounce + ikz["start"],
-                                                     end=increment + left_bounce + ikz["stop"],
+                                                     start=increment + ikz["start"],
+                                                     end=increment + ikz["stop"],
                                                      attachments=markup))
                     left_bounce = ikz["stop"]
                 if text_markup[tm].end - (increment + left_bounce) > 0:
@@ -317,19 +879,19 @@ class TextMarkUp:
                 increment = text_markup[tm].start
                 left_bounce = 0
                 for ogrn in ogrns:
-                    if ogrn["start"] > 0:
+                    if ogrn["start"] > left_bounce:
                         result_markup.append(MarkUpBlock(text=text_markup[tm].text[left_bounce: ogrn["start"]],
                                                          block_type=MarkUpType.NOTHING,
                                                          start=increment + left_bounce,
-                                                         end=increment + left_bounce + ogrn["start"]))
+                                                         end=increment + ogrn["start"]))
                     markup = {}
                     if "OGRN" in ogrn["fact"]:
                         markup["OGRN"] = ogrn["fact"]["OGRN"]
                     result_markup.append(MarkUpBlock(text=text_markup[tm].text[ogrn["start"]:
                                                                                ogrn["stop"]],
                                                      block_type=MarkUpType.OGRN,
-                                                     start=increment + left_bounce + ogrn["start"],
-                                                     end=increment + left_bounce + ogrn["stop"],
+                                                     start=increment + ogrn["start"],
+                                                     end=increment + ogrn["stop"],
                                                      attachments=markup))
                     left_bounce = ogrn["stop"]
                 if text_markup[tm].end - (increment + left_bounce) > 0:
@@ -356,19 +918,19 @@ class TextMarkUp:
                 increment = text_markup[tm].start
                 left_bounce = 0
                 for okpo in okpos:
-                    if okpo["start"] > 0:
+                    if okpo["start"] > left_bounce:
                         result_markup.append(MarkUpBlock(text=text_markup[tm].text[left_bounce: okpo["start"]],
                                                          block_type=MarkUpType.NOTHING,
                                                          start=increment + left_bounce,
-                                                         end=increment + left_bounce + okpo["start"]))
+                                                         end=increment + okpo["start"]))
                     markup = {}
                     if "OKPO" in okpo["fact"]:
                         markup["OKPO"] = okpo["fact"]["OKPO"]
                     result_markup.append(MarkUpBlock(text=text_markup[tm].text[okpo["start"]:
                                                                                okpo["stop"]],
                                                      block_type=MarkUpType.OKPO,
-                                                     start=increment + left_bounce + okpo["start"],
-                                                     end=increment + left_bounce + okpo["stop"],
+                                                     start=increment + okpo["start"],
+                                                     end=increment + okpo["stop"],
                                                      attachments=markup))
                     left_bounce = okpo["stop"]
                 if text_markup[tm].end - (increment + left_bounce) > 0:
@@ -395,19 +957,19 @@ class TextMarkUp:
                 increment = text_markup[tm].start
                 left_bounce = 0
                 for oktmo in oktmos:
-                    if oktmo["start"] > 0:
+                    if oktmo["start"] > left_bounce:
                         result_markup.append(MarkUpBlock(text=text_markup[tm].text[left_bounce: oktmo["start"]],
                                                          block_type=MarkUpType.NOTHING,
                                                          start=increment + left_bounce,
-                                                         end=increment + left_bounce + oktmo["start"]))
+                                                         end=increment + oktmo["start"]))
                     markup = {}
                     if "OKTMO" in oktmo["fact"]:
                         markup["OKTMO"] = oktmo["fact"]["OKTMO"]
                     result_markup.append(MarkUpBlock(text=text_markup[tm].text[oktmo["start"]:
                                                                                oktmo["stop"]],
                                                      block_type=MarkUpType.OKTMO,
-                                                     start=increment + left_bounce + oktmo["start"],
-                                                     end=increment + left_bounce + oktmo["stop"],
+                                                     start=increment + oktmo["start"],
+                                                     end=increment + oktmo["stop"],
                                                      attachments=markup))
                     left_bounce = oktmo["stop"]
                 if text_markup[tm].end - (increment + left_bounce) > 0:
@@ -435,19 +997,19 @@ class TextMarkUp:
                 increment = text_markup[tm].start
                 left_bounce = 0
                 for okato in okatos:
-                    if okato["start"] > 0:
+                    if okato["start"] > left_bounce:
                         result_markup.append(MarkUpBlock(text=text_markup[tm].text[left_bounce: okato["start"]],
                                                          block_type=MarkUpType.NOTHING,
                                                          start=increment + left_bounce,
-                                                         end=increment + left_bounce + okato["start"]))
+                                                         end=increment + okato["start"]))
                     markup = {}
                     if "OKATO" in okato["fact"]:
                         markup["OKATO"] = okato["fact"]["OKATO"]
                     result_markup.append(MarkUpBlock(text=text_markup[tm].text[okato["start"]:
                                                                                okato["stop"]],
                                                      block_type=MarkUpType.OKATO,
-                                                     start=increment + left_bounce + okato["start"],
-                                                     end=increment + left_bounce + okato["stop"],
+                                                     start=increment + okato["start"],
+                                                     end=increment + okato["stop"],
                                                      attachments=markup))
                     left_bounce = okato["stop"]
                 if text_markup[tm].end - (increment + left_bounce) > 0:
@@ -475,19 +1037,19 @@ class TextMarkUp:
                 increment = text_markup[tm].start
                 left_bounce = 0
                 for bic in bics:
-                    if bic["start"] > 0:
+                    if bic["start"] > left_bounce:
                         result_markup.append(MarkUpBlock(text=text_markup[tm].text[left_bounce: bic["start"]],
                                                          block_type=MarkUpType.NOTHING,
                                                          start=increment + left_bounce,
-                                                         end=increment + left_bounce + bic["start"]))
+                                                         end=increment + bic["start"]))
                     markup = {}
                     if "BIC" in bic["fact"]:
                         markup["BIC"] = bic["fact"]["BIC"]
                     result_markup.append(MarkUpBlock(text=text_markup[tm].text[bic["start"]:
                                                                                bic["stop"]],
                                                      block_type=MarkUpType.BIC,
-                                                     start=increment + left_bounce + bic["start"],
-                                                     end=increment + left_bounce + bic["stop"],
+                                                     start=increment + bic["start"],
+                                                     end=increment + bic["stop"],
                                                      attachments=markup))
                     left_bounce = bic["stop"]
                 if text_markup[tm].end - (increment + left_bounce) > 0:
@@ -514,19 +1076,19 @@ class TextMarkUp:
                 increment = text_markup[tm].start
                 left_bounce = 0
                 for snils in snilses:
-                    if snils["start"] > 0:
+                    if snils["start"] > left_bounce:
                         result_markup.append(MarkUpBlock(text=text_markup[tm].text[left_bounce: snils["start"]],
                                                          block_type=MarkUpType.NOTHING,
                                                          start=increment + left_bounce,
-                                                         end=increment + left_bounce + snils["start"]))
+                                                         end=increment + snils["start"]))
                     markup = {}
                     if "SNILS" in snils["fact"]:
                         markup["SNILS"] = snils["fact"]["SNILS"]
                     result_markup.append(MarkUpBlock(text=text_markup[tm].text[snils["start"]:
                                                                                snils["stop"]],
                                                      block_type=MarkUpType.SNILS,
-                                                     start=increment + left_bounce + snils["start"],
-                                                     end=increment + left_bounce + snils["stop"],
+                                                     start=increment + snils["start"],
+                                                     end=increment + snils["stop"],
                                                      attachments=markup))
                     left_bounce = snils["stop"]
                 if text_markup[tm].end - (increment + left_bounce) > 0:
@@ -553,19 +1115,19 @@ class TextMarkUp:
                 increment = text_markup[tm].start
                 left_bounce = 0
                 for email in emails:
-                    if email["start"] > 0:
+                    if email["start"] > left_bounce:
                         result_markup.append(MarkUpBlock(text=text_markup[tm].text[left_bounce: email["start"]],
                                                          block_type=MarkUpType.NOTHING,
                                                          start=increment + left_bounce,
-                                                         end=increment + left_bounce + email["start"]))
+                                                         end=increment + email["start"]))
                     markup = {}
                     if "Email" in email["fact"]:
                         markup["Email"] = email["fact"]["Email"]
                     result_markup.append(MarkUpBlock(text=text_markup[tm].text[email["start"]:
                                                                                email["stop"]],
                                                      block_type=MarkUpType.EMAIL,
-                                                     start=increment + left_bounce + email["start"],
-                                                     end=increment + left_bounce + email["stop"],
+                                                     start=increment + email["start"],
+                                                     end=increment + email["stop"],
                                                      attachments=markup))
                     left_bounce = email["stop"]
                 if text_markup[tm].end - (increment + left_bounce) > 0:
@@ -592,19 +1154,19 @@ class TextMarkUp:
                 increment = text_markup[tm].start
                 left_bounce = 0
                 for url in urls:
-                    if url["start"] > 0:
+                    if url["start"] > left_bounce:
                         result_markup.append(MarkUpBlock(text=text_markup[tm].text[left_bounce: url["start"]],
                                                          block_type=MarkUpType.NOTHING,
                                                          start=increment + left_bounce,
-                                                         end=increment + left_bounce + url["start"]))
+                                                         end=increment + url["start"]))
                     markup = {}
                     if "Url" in url["fact"]:
                         markup["Url"] = url["fact"]["Url"]
                     result_markup.append(MarkUpBlock(text=text_markup[tm].text[url["start"]:
                                                                                url["stop"]],
                                                      block_type=MarkUpType.URL,
-                                                     start=increment + left_bounce + url["start"],
-                                                     end=increment + left_bounce + url["stop"],
+                                                     start=increment + url["start"],
+                                                     end=increment + url["stop"],
                                                      attachments=markup))
                     left_bounce = url["stop"]
                 if text_markup[tm].end - (increment + left_bounce) > 0:
@@ -624,12 +1186,16 @@ class TextMarkUp:
         """
         This method reformats the markup, combines unmarked elements (the consequences of using Natasha),
         removes empty elements (arise as a result of using the algorithm)
+        The markup is walked once, it is sorted by start only when the blocks come out of order, and every run of
+        blocks of one type is joined at once.
         :param join_similar:
         :param delete_empty:
         :param text_markup: Markuped text
         :return List[Dict[str, dict]]
         """
-        text_markup = sorted(text_markup, key=lambda x: x.start)
+        text_markup = list(text_markup)
+        if any(text_markup[index].start > text_markup[index + 1].start for index in range(len(text_markup) - 1)):
+            text_markup.sort(key=lambda x: x.start)
         # for index in range(len(text_markup) - 1):
         #     if text_markup[index].block_type == MarkUpType.NOTHING and \
         #             text_markup[index + 1].block_type == MarkUpType.NOTHING:
@@ -640,31 +1206,49 @@ class TextMarkUp:
         #     else:
         #         result.append(text_markup[index])
         if delete_empty:
-            text_markup = [text_markup[index] for index in range(len(text_markup)) if len(text_markup[index].text) > 0]
+            text_markup = [block for block in text_markup if len(block.text) > 0]
 
         if join_similar:
-            index = 0
             result = []
-            last_tag = None
+            index = 0
             while index < len(text_markup):
-
-                if text_markup[index].block_type != last_tag:
-                    result.append(MarkUpBlock(text=text_markup[index].text,
-                                              block_type=text_markup[index].block_type,
-                                              start=text_markup[index].start,
-                                              end=text_markup[index].end))
+                stop = index + 1
+                while stop < len(text_markup) and text_markup[stop].block_type == text_markup[index].block_type:
+                    stop += 1
+                first = text_markup[index]
+                if stop - index == 1:
+                    result.append(MarkUpBlock(text=first.text, block_type=first.block_type, start=first.start,
+                                              end=first.end))
                 else:
-
-                    result[-1].text = f"{result[-1].text} {text_markup[index].text}".strip()
-                    result[-1].text = result[-1].text.strip()
+                    result.append(MarkUpBlock(text=first.text, block_type=first.block_type, start=first.start))
+                    result[-1].text = TextMarkUp._join_texts(texts=[block.text for block in text_markup[index: stop]])
                     result[-1].end = result[-1].start + len(result[-1].text)
-                last_tag = text_markup[index].block_type
-                index += 1
-            return sorted(result, key=lambda x: x.start)
-        return sorted(text_markup, key=lambda x: x.start)
+                index = stop
+            return result
+        return text_markup
+
+    @staticmethod
+    def _join_texts(texts: List[str]) -> str:
+        """
+        This method joins the texts of the blocks of one run with spaces by one 'join', the result is the same as
+        adding the texts one by one and stripping the sum after every step: the whitespace texts after the first two
+        are skipped and the trailing whitespace of every text after the first is lost. When the sum of the first two
+        texts is empty, it is given as it is, and setting it as the text of a block fails like the steps do.
+        :param texts: Texts of at least two blocks
+        :return: str
+        """
+        first = f"{texts[0]} {texts[1]}".strip()
+        if len(first) == 0:
+            return first
+        parts = [first]
+        for text in texts[2:]:
+            text = text.rstrip()
+            if len(text) > 0:
+                parts.append(text)
+        return " ".join(parts)
 
     @staticmethod
-    def _phone_extractor(text: str) -> List[Dict[str, Any]] or None:
+    def _phone_extractor(text: str) -> Iterator[Dict[str, Any]]:
         """
         This is a generator that searches for phone numbers in the text.
         Supported:
@@ -673,19 +1257,10 @@ class TextMarkUp:
         7(XXX)XXXXXXX -> +7(XXX)XXXXXXX -> 8(XXX)XXXXXXX -> (XXX)XXXXXXX
         7XXXXXXXXXX -> +7XXXXXXXXXX -> 8XXXXXXXXXX -> XXXXXXXXXX
         """
-        left_bounce = 0
-        re_phone = '(тел|тел.|телефон|факс|ф.).?.?' \
-                   '(\+7|7|8)?[\s\-]?\(?[0-9]{3}\)?[\s\-]?[0-9]{3}[\s\-]?[0-9]{2}[\s\-]?[0-9]{2}(\s|\D)'
-        text = f"{text} "
-        while re.search(re_phone, text, re.IGNORECASE) is not None:
-            phone = re.search(re_phone, text, re.IGNORECASE)
-            yield {"start": phone.start() + left_bounce, "stop": phone.end() + left_bounce, "fact":
-                {"phoneNumber": TextMarkUp._clean_string(text[phone.start(): phone.end()]).strip()}}
-            left_bounce = phone.end()
-            text = text[phone.end():]
+        yield from TextMarkUp._requisite_extractor(text=text, pattern=_RE_REQUISITE["phoneNumber"])
 
     @staticmethod
-    def _INN_extractor(text: str) -> List[Dict[str, Any]] or None:
+    def _INN_extractor(text: str) -> Iterator[Dict[str, Any]]:
         """
         This is a generator that searches for inn's in the text.
         Supported:
@@ -694,206 +1269,190 @@ class TextMarkUp:
         инн XXXXXXXXXXXX (organisation inn)
         иннXXXXXXXXXXXX (organisation inn)
         """
-        left_bounce = 0
-        re_org_inn = '(инн).?.?[0-9]{10}(\s|\D)'
-        re_per_inn = '(инн).?.?[0-9]{12}(\s|\D)'
-        text = f"{text} "
-        while re.search(re_org_inn, text, re.IGNORECASE) is not None or re.search(re_per_inn, text,
-                                                                                  re.IGNORECASE) is not None:
-            founded_org = re.search(re_org_inn, text, re.IGNORECASE)
-            founded_per = re.search(re_per_inn, text, re.IGNORECASE)
-            if founded_org is not None or founded_per is not None:
-                if founded_org is not None and founded_per is not None:
-                    if founded_org.start() < founded_per.start():
-                        inn_extract = founded_org
-                        fact = "organizationINN"
-                    else:
-                        inn_extract = founded_per
-                        fact = "personalINN"
-                elif founded_org is not None:
-                    inn_extract = founded_org
-                    fact = "organizationINN"
-                elif founded_per is not None:
-                    inn_extract = founded_per
-                    fact = "personalINN"
-                yield {"start": inn_extract.start() + left_bounce, "stop": inn_extract.end() + left_bounce, "fact":
-                    {fact: TextMarkUp._clean_string(text[inn_extract.start(): inn_extract.end()]).strip()}}
-                left_bounce = inn_extract.end()
-                text = text[inn_extract.end():]
+        yield from TextMarkUp._requisite_extractor(text=text, pattern=_RE_INN)
 
     @staticmethod
-    def _KPP_extractor(text: str) -> List[Dict[str, Any]] or None:
+    def _KPP_extractor(text: str) -> Iterator[Dict[str, Any]]:
         """
         This is a generator that searches for kpp's in the text.
         Supported:
         кпп XXXXXXXXXX
         кппXXXXXXXXXX
         """
-        left_bounce = 0
-        re_kpp = '(кпп).?.?\d{9}(\s|\D)'
-        text = f"{text} "
-        while re.search(re_kpp, text, re.IGNORECASE) is not None:
-            kpp = re.search(re_kpp, text, re.IGNORECASE)
-            yield {"start": kpp.start() + left_bounce, "stop": kpp.end() + left_bounce, "fact":
-                {"KPP": TextMarkUp._clean_string(text[kpp.start(): kpp.end()]).strip()}}
-            left_bounce = kpp.end()
-            text = text[kpp.end():]
+        yield from TextMarkUp._requisite_extractor(text=text, pattern=_RE_REQUISITE["KPP"])
 
     @staticmethod
-    def _IKZ_extractor(text: str) -> List[Dict[str, Any]] or None:
+    def _IKZ_extractor(text: str) -> Iterator[Dict[str, Any]]:
         """
         This is a generator that searches for ikz's in the text.
         Supported:
         икз XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
         икзXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
         """
-        left_bounce = 0
-        re_ikz = '(икз).?.?\d{36}(\s|\D)?'
-        text = f"{text} "
-        while re.search(re_ikz, text, re.IGNORECASE) is not None:
-            ikz = re.search(re_ikz, text, re.IGNORECASE)
-            yield {"start": ikz.start() + left_bounce, "stop": ikz.end() + left_bounce, "fact":
-                {"IKZ": TextMarkUp._clean_string(text[ikz.start(): ikz.end()]).strip()}}
-            left_bounce = ikz.end()
-            text = text[ikz.end():]
+        yield from TextMarkUp._requisite_extractor(text=text, pattern=_RE_REQUISITE["IKZ"])
 
     @staticmethod
-    def _OGRN_extractor(text: str) -> List[Dict[str, Any]] or None:
+    def _OGRN_extractor(text: str) -> Iterator[Dict[str, Any]]:
         """
         This is a generator that searches for ikz's in the text.
         Supported:
         огрн XXXXXXXXXXXXX
         огрнXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
         """
-        left_bounce = 0
-        re_ogrn = '(огрн).?.?\d{13}(\s|\D)'
-        text = f"{text} "
-        while re.search(re_ogrn, text, re.IGNORECASE) is not None:
-            ogrn = re.search(re_ogrn, text, re.IGNORECASE)
-            yield {"start": ogrn.start() + left_bounce, "stop": ogrn.end() + left_bounce, "fact":
-                {"OGRN": TextMarkUp._clean_string(text[ogrn.start(): ogrn.end()]).strip()}}
-            left_bounce = ogrn.end()
-            text = text[ogrn.end():]
+        yield from TextMarkUp._requisite_extractor(text=text, pattern=_RE_REQUISITE["OGRN"])
 
     @staticmethod
-    def _OKPO_extractor(text: str) -> List[Dict[str, Any]] or None:
+    def _OKPO_extractor(text: str) -> Iterator[Dict[str, Any]]:
         """
         This is a generator that searches for ikz's in the text.
         Supported:
         окпо XXXXXXXX
         окпоXXXXXXXX
         """
-        left_bounce = 0
-        re_okpo = '(окпо).?.?\d{8}(\s|\D)'
-        text = f"{text} "
-        while re.search(re_okpo, text, re.IGNORECASE) is not None:
-            okpo = re.search(re_okpo, text, re.IGNORECASE)
-            yield {"start": okpo.start() + left_bounce, "stop": okpo.end() + left_bounce, "fact":
-                {"OKPO": TextMarkUp._clean_string(text[okpo.start(): okpo.end()]).strip()}}
-            left_bounce = okpo.end()
-            text = text[okpo.end():]
+        yield from TextMarkUp._requisite_extractor(text=text, pattern=_RE_REQUISITE["OKPO"])
 
     @staticmethod
-    def _OKTMO_extractor(text: str) -> List[Dict[str, Any]] or None:
+    def _OKTMO_extractor(text: str) -> Iterator[Dict[str, Any]]:
         """
         This is a generator that searches for ikz's in the text.
         Supported:
         октмо XXXXXXXXX
         октмоXXXXXXXXX
         """
-        left_bounce = 0
-        re_oktmo = '(октмо).?.?\d{9}(\s|\D)'
-        text = f"{text} "
-        while re.search(re_oktmo, text, re.IGNORECASE) is not None:
-            oktmo = re.search(re_oktmo, text, re.IGNORECASE)
-            yield {"start": oktmo.start() + left_bounce, "stop": oktmo.end() + left_bounce, "fact":
-                {"OKTMO": TextMarkUp._clean_string(text[oktmo.start(): oktmo.end()]).strip()}}
-            left_bounce = oktmo.end()
-            text = text[oktmo.end():]
+        yield from TextMarkUp._requisite_extractor(text=text, pattern=_RE_REQUISITE["OKTMO"])
 
     @staticmethod
-    def _OKATO_extractor(text: str) -> List[Dict[str, Any]] or None:
+    def _OKATO_extractor(text: str) -> Iterator[Dict[str, Any]]:
         """
         This is a generator that searches for ikz's in the text.
         Supported:
         окато XXX XXX XXX XX
         окатоXXXXXXXXXXX
         """
-        left_bounce = 0
-        re_okato = '(окато).?.?\d{11}(\s|\D)'
-        text = f"{text} "
-        while re.search(re_okato, text, re.IGNORECASE) is not None:
-            okato = re.search(re_okato, text, re.IGNORECASE)
-            yield {"start": okato.start() + left_bounce, "stop": okato.end() + left_bounce, "fact":
-                {"OKATO": TextMarkUp._clean_string(text[okato.start(): okato.end()]).strip()}}
-            left_bounce = okato.end()
-            text = text[okato.end():]
+        yield from TextMarkUp._requisite_extractor(text=text, pattern=_RE_REQUISITE["OKATO"])
 
     @staticmethod
-    def _BIC_extractor(text: str) -> List[Dict[str, Any]] or None:
+    def _BIC_extractor(text: str) -> Iterator[Dict[str, Any]]:
         """
         This is a generator that searches for bic's in the text.
         Supported:
         БИК XXXXXXXXXX
         БИКXXXXXXXXXX
         """
-        left_bounce = 0
-        re_bic = '(БИК).?.?\d{9}(\s|\D)?'
-        text = f"{text} "
-        while re.search(re_bic, text, re.IGNORECASE) is not None:
-            bic = re.search(re_bic, text, re.IGNORECASE)
-            yield {"start": bic.start() + left_bounce, "stop": bic.end() + left_bounce, "fact":
-                {"BIC": TextMarkUp._clean_string(text[bic.start(): bic.end()]).strip()}}
-            left_bounce = bic.end()
-            text = text[bic.end():]
+        yield from TextMarkUp._requisite_extractor(text=text, pattern=_RE_REQUISITE["BIC"])
 
     @staticmethod
-    def _snils_extractor(text: str) -> List[Dict[str, Any]] or None:
+    def _snils_extractor(text: str) -> Iterator[Dict[str, Any]]:
         """
         This is a generator that searches for inn's in the text.
         Supported:
         снилс XXX-XXX-XXX XX
         снилсXXX-XXX-XXX XX
         """
-        left_bounce = 0
-        re_snils = '(снилс).?.?\d{3}-\d{3}-\d{3}\x20?-?\x20?\d{2}(\s|\D)'
-        text = f"{text} "
-        while re.search(re_snils, text, re.IGNORECASE) is not None:
-            snils = re.search(re_snils, text, re.IGNORECASE)
-            yield {"start": snils.start() + left_bounce, "stop": snils.end() + left_bounce, "fact":
-                {"SNILS": TextMarkUp._clean_string(text[snils.start(): snils.end()]).strip()}}
-            left_bounce = snils.end()
-            text = text[snils.end():]
+        yield from TextMarkUp._requisite_extractor(text=text, pattern=_RE_REQUISITE["SNILS"])
 
     @staticmethod
-    def _email_extractor(text: str) -> List[Dict[str, Any]] or None:
+    def _email_extractor(text: str) -> Iterator[Dict[str, Any]]:
         """
         This is a generator that searches for email's in the text.
         """
-        left_bounce = 0
-        re_email = 'e?-?mail?.?.?[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}'
-        text = f"{text} "
-        while re.search(re_email, text, re.IGNORECASE) is not None:
-            email = re.search(re_email, text, re.IGNORECASE)
-            yield {"start": email.start() + left_bounce, "stop": email.end() + left_bounce, "fact":
-                {"Email": TextMarkUp._clean_string(text[email.start(): email.end()]).strip()}}
-            left_bounce = email.end()
-            text = text[email.end():]
+        yield from TextMarkUp._requisite_extractor(text=text, pattern=_RE_REQUISITE["Email"])
 
     @staticmethod
-    def _url_extractor(text: str) -> List[Dict[str, Any]] or None:
+    def _url_extractor(text: str) -> Iterator[Dict[str, Any]]:
         """
         This is a generator that searches for url's in the text.
         """
+        yield from TextMarkUp._requisite_extractor(text=text, pattern=_RE_REQUISITE["Url"])
+
+    @staticmethod
+    def _requisite_extractor(text: str, pattern: Pattern) -> Iterator[Dict[str, Any]]:
+        """
+        This is a generator that searches for requisites in the text with one precompiled pattern in one pass.
+        The fact is named after the matched group of the pattern.
+        """
+        for requisite in pattern.finditer(f"{text} "):
+            yield TextMarkUp._get_requisite_fact(requisite=requisite)
+
+    @staticmethod
+    def _requisites_extractor(text: str) -> Iterator[Dict[str, Any]]:
+        """
+        This is a generator that searches for all requisites of '_REQUISITES' in the text in one pass and gives them
+        in the order of the text, the same as the passes of get_*_markup find one after another: every pass looks for
+        its requisites only in the gaps that the passes before it have left unmarked, each gap as a text of its own.
+        The one pattern of all requisites finds the requisite that starts first, so it differs from the passes only
+        where a requisite of an earlier pass starts inside the found one. Such places are looked for by the patterns
+        of the earlier passes at the letters of every found requisite, and only the lines around them are marked up
+        by the passes.
+        """
+        padded = f"{text} "
+        requisites = list(_RE_REQUISITES.finditer(padded))
         left_bounce = 0
-        re_url = '[a-zA-Z0-9][a-zA-Z0-9-]{1,61}[a-zA-Z0-9]\.[a-zA-Z]{2,6}'
-        text = f"{text} "
-        while re.search(re_url, text, re.IGNORECASE) is not None:
-            furl = re.search(re_url, text, re.IGNORECASE)
-            yield {"start": furl.start() + left_bounce, "stop": furl.end() + left_bounce, "fact":
-                {"Url": text[furl.start(): furl.end()].replace("снилс", "").strip()}}
-            left_bounce = furl.end()
-            text = text[furl.end():]
+        index = 0
+        while index < len(requisites):
+            collision = TextMarkUp._get_requisite_collision(text=padded, requisite=requisites[index])
+            if collision is None:
+                requisite = TextMarkUp._get_requisite_fact(requisite=requisites[index])
+                requisite["stop"] = min(requisite["stop"], len(text))
+                left_bounce = requisite["stop"]
+                index += 1
+                yield requisite
+                continue
+            cut = _RE_REQUISITE_CUT.search(text, min(max(collision, requisites[index].end()), len(text)) - 1)
+            piece_stop = cut.end() if cut is not None else len(text)
+            while index < len(requisites) and requisites[index].start() < piece_stop:
+                index += 1
+            yield from TextMarkUp._get_passes_requisites(text=text, start=left_bounce, end=piece_stop)
+            left_bounce = piece_stop
+
+    @staticmethod
+    def _get_requisite_collision(text: str, requisite: Match) -> int or None:
+        """
+        :return: The greatest end of the requisites of the passes before the pass of the requisite, witch start
+         inside it, or None, when there are no such requisites
+        """
+        pattern = _RE_REQUISITE_PRIORS[_REQUISITE_PASS[requisite.lastgroup]]
+        if pattern is None:
+            return None
+        collision = None
+        for position in range(requisite.start() + 1, requisite.end()):
+            prior = pattern.match(text, position)
+            if prior is not None and (collision is None or prior.end() > collision):
+                collision = prior.end()
+        return collision
+
+    @staticmethod
+    def _get_passes_requisites(text: str, start: int, end: int) -> List[Dict[str, Any]]:
+        """
+        This method marks up the piece of the text by the passes of '_REQUISITE_PASSES' one after another, every pass
+        looks for its requisites in the gaps left by the passes before it.
+        :return: The requisites in the order of the text
+        """
+        requisites = []
+        gaps = [(start, end)]
+        for pattern in _RE_REQUISITE_PASSES:
+            pass_gaps = []
+            for gap_start, gap_end in gaps:
+                left_bounce = gap_start
+                for requisite in pattern.finditer(f"{text[gap_start: gap_end]} "):
+                    fact = TextMarkUp._get_requisite_fact(requisite=requisite)
+                    fact["start"], fact["stop"] = gap_start + fact["start"], min(gap_start + fact["stop"], gap_end)
+                    if fact["start"] > left_bounce:
+                        pass_gaps.append((left_bounce, fact["start"]))
+                    requisites.append(fact)
+                    left_bounce = fact["stop"]
+                if gap_end > left_bounce:
+                    pass_gaps.append((left_bounce, gap_end))
+            gaps = pass_gaps
+        return sorted(requisites, key=lambda requisite: requisite["start"])
+
+    @staticmethod
+    def _get_requisite_fact(requisite: Match) -> Dict[str, Any]:
+        if requisite.lastgroup == "Url":
+            value = requisite.group().replace("снилс", "").strip()
+        else:
+            value = TextMarkUp._clean_string(requisite.group()).strip()
+        return {"start": requisite.start(), "stop": requisite.end(), "fact": {requisite.lastgroup: value}}
 
     @staticmethod
     def _clean_string(sentence):
@@ -906,19 +1465,81 @@ class TextMarkUp:
         return sentence
 
     def _prepear_text_to_bert(self, text: str, border: int) -> List[str]:
+        return [text[start: end] for start, end in self._get_sector_spans(text=text, border=border)]
+
+    def _get_sector_spans(self, text: str, border: int = None) -> List[Tuple[int, int]]:
+        """
+        This method cuts the text into sectors by the chunker and gives the (start, end) span of every sector,
+        the last sector ends with the last token and is empty when the text has no tokens left for it.
+        :param text: The text witch we need tu markup
+        :param border: Count of tokens in one sector, by default the one of the chunker
+        :return: List[Tuple[int, int]]
+        """
+        return [(start, end) for start, end, _, _ in self._get_sector_windows(text=text, border=border)]
+
+    def _get_sector_windows(self,
+                            text: str,
+                            border: int = None,
+                            start: int = 0,
+                            final: bool = True) -> List[Tuple[int, int, int, int]]:
+        """
+        This method cuts the text into sectors by the chunker and gives the span of every sector with its context.
+        :param text: The text witch we need tu markup
+        :param border: Count of tokens in one sector, by default the one of the chunker
+        :param start: Where the first sector starts, see SectorChunker.split
+        :param final: Whether the text is whole, see SectorChunker.split
+        :return: List of (start, end, context start, context end) of the sectors
+        """
         # while '\n' in text or '  ' in text:
         #     text = text.replace("\n", " ").replace("  ", " ")
-        tokens = self._tokenizer.tokenize(text)
-        counter = 0
-        this_text = ""
-        sectors = []
-        for token in tokens:
-            this_text += text[:text.index(token) + len(token)]
-            text = text[text.index(token) + len(token):]
-            counter += 1
-            if counter >= border:
-                sectors.append(this_text)
-                this_text = ""
-                counter = 0
-        sectors.append(this_text)
+        with self._tracer.stage("sectoring") as record:
+            if self._chunker.max_subwords is not None:
+                self._get_subword_tokenize()
+            token_spans = self._align_tokens(text=text, tokens=self.tokenizer.tokenize(text))
+            sectors = self._chunker.split(text=text, token_spans=token_spans, start=start, final=final, border=border)
+            record.blocks_out = len(sectors)
         return sectors
+
+    @staticmethod
+    def _get_window_sectors(key: Any,
+                            text: str,
+                            windows: List[Tuple[int, int, int, int]],
+                            offset: int = 0) -> List[Tuple[Any, str, int, Tuple[int, int]]]:
+        """
+        :param key: Key of the text
+        :param text: The text
+        :param windows: The sectors of the text, see _get_sector_windows
+        :param offset: Offset of the text in the whole document
+        :return: Items (key, text of the window, offset of the window, (start, end) of the sector) for
+         _get_sectors_markup
+        """
+        return [(key, text[context_start: context_end], offset + context_start, (offset + start, offset + end))
+                for start, end, context_start, context_end in windows]
+
+    @staticmethod
+    def _clip_markup(text_markup: List[MarkUpBlock],
+                     text: str,
+                     start_index: int,
+                     start: int,
+                     end: int) -> List[MarkUpBlock]:
+        """
+        This method cuts the markup of the window of a sector back to the span of the sector.
+        :param text_markup: Markup of the window
+        :param text: Text of the window
+        :param start_index: Offset of the window
+        :param start: Start of the sector
+        :param end: End of the sector
+        :return: List[MarkUpBlock]
+        """
+        if start == start_index and end == start_index + len(text):
+            return text_markup
+        result = []
+        for block in text_markup:
+            if block.start >= start and block.end <= end:
+                result.append(block)
+                continue
+            block_start, block_end = max(block.start, start), min(block.end, end)
+            piece = text[block_start - start_index: block_end - start_index].strip()
+            if block_start < block_end and len(piece) > 0:
+                result.append(MarkUpBlock(text=piece, block_type=block.block_type, start=block_start, end=block_end))
+        return result
@@ -0,0 +1,215 @@
+import gc
+import os
+import queue
+import multiprocessing
+from NER.text_markup import *
+from NER.workers import *
+from typing import List, Dict, Any, Callable, Tuple
+
+# The models of the pool, they are set in the parent before the fork and are inherited by the workers, so the workers
+# do not load them and do not get them pickled
+_POOL_MARKUP = None
+_POOL_QA_MODEL = None
+
+
+class MarkUpPool:
+    """
+    :ru Пул процессов разметки, разделяющих одну загруженную в родителе модель.
+    :en A pool of markup processes that share one model loaded in the parent.
+
+    The models are loaded once in this process and the workers are forked after that, so the pages of the weights are
+    shared by all workers copy-on-write and are not copied while the models are only read: the calls run under
+    the inference mode and the objects of the parent are frozen for the garbage collector before the fork. With
+    'share_memory' the weights of the torch models are moved to shared memory before the fork, then they are shared
+    even when something writes to them. Every worker gets its share of the cores for the threads of torch.
+    The cache of the marker is shared only through its disk store, every worker opens the store again and commits
+    every new entry, so the workers do not block each other.
+
+    The fork start method is needed, so the pool works only on Linux and macOS. The models should not be called in
+    this process before the pool is started, the thread pools of torch do not survive the fork.
+    """
+
+    def __init__(self,
+                 text_markup: TextMarkUp,
+                 workers: int = None,
+                 qa_model: Callable = None,
+                 share_memory: bool = False,
+                 interop_threads: int = 1) -> None:
+        """
+        :param text_markup: The marker, its model is loaded by the start of the pool
+        :param workers: Count of the worker processes, by default the count of cores
+        :param qa_model: The QA model, it takes the lists of contexts and questions, like squad_ru_bert
+        :param share_memory: Whether to move the weights of the torch models to shared memory before the fork
+        :param interop_threads: Count of the inter-op threads of every worker
+        """
+        if workers is None:
+            workers = get_cores_count()
+        if workers <= 0:
+            raise ValueError(f"Workers count should be grater then zero")
+        if "fork" not in multiprocessing.get_all_start_methods():
+            raise ValueError(f"The pool needs the fork start method, witch this platform has not")
+        self._text_markup = text_markup
+        self._qa_model = qa_model
+        self._workers = workers
+        self._share_memory = share_memory
+        self._interop_threads = interop_threads
+        self._pool = None
+        self._pids_queue = None
+        self._pids = []
+
+    @property
+    def workers(self) -> int:
+        return self._workers
+
+    def start(self) -> 'MarkUpPool':
+        """
+        This method loads the models, when they are not loaded yet, and forks the workers.
+        """
+        global _POOL_MARKUP, _POOL_QA_MODEL
+        if self._pool is not None:
+            return self
+        self._text_markup.load()
+        if self._share_memory:
+            for model in [self._text_markup.ner_model if self._text_markup.is_bert else None, self._qa_model]:
+                for module in _get_torch_modules(model=model):
+                    module.share_memory()
+        if self._text_markup.cache is not None:
+            self._text_markup.cache.flush()
+        _POOL_MARKUP, _POOL_QA_MODEL = self._text_markup, self._qa_model
+        gc.collect()
+        if hasattr(gc, "freeze"):
+            gc.freeze()
+        num_threads, num_interop_threads = get_worker_threads(workers=self._workers,
+                                                              interop_threads=self._interop_threads)
+        context = multiprocessing.get_context("fork")
+        self._pids_queue = context.Queue()
+        self._pool = context.Pool(processes=self._workers, initializer=_init_worker,
+                                  initargs=(num_threads, num_interop_threads, self._pids_queue))
+        if hasattr(gc, "unfreeze"):
+            gc.unfreeze()
+        self._pids = [self._pids_queue.get() for _ in range(self._workers)]
+        return self
+
+    def close(self) -> None:
+        global _POOL_MARKUP, _POOL_QA_MODEL
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+            self._pids_queue.close()
+            self._pids_queue = None
+            self._pids = []
+        _POOL_MARKUP, _POOL_QA_MODEL = None, None
+
+    def __enter__(self) -> 'MarkUpPool':
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def get_markup(self, text: str) -> List[MarkUpBlock]:
+        """
+        :param text: A string that needs markup
+        :return: The same markup as TextMarkUp.get_markup gives
+        """
+        return self.get_markup_many(texts=[text])[0]
+
+    def get_markup_many(self, texts: List[str]) -> List[List[MarkUpBlock]]:
+        """
+        This method marks up every text in a worker, the texts are given to the workers one by one, so a long text
+        does not hold the others.
+        :param texts: Strings that need markup
+        :return: The markups in the order of the texts
+        """
+        return self._get_pool().map(_mark_up, texts, chunksize=1)
+
+    def answer_many(self, questions: List[str], texts: List[str]) -> List[str]:
+        """
+        :param questions: The questions
+        :param texts: The texts of the questions
+        :return: The answers in the order of the questions
+        """
+        if self._qa_model is None:
+            raise ValueError(f"The pool has no QA model")
+        if len(questions) != len(texts):
+            raise ValueError(f"Got {len(questions)} questions, but {len(texts)} texts")
+        return self._get_pool().map(_answer, list(zip(texts, questions)), chunksize=1)
+
+    def memory(self) -> Dict[int, Dict[str, int]]:
+        """
+        This method reads the memory of the workers from /proc, so it gives nothing on other platforms than Linux.
+        The weights shared by the workers are counted in 'shared' and divided among them in 'pss'. The workers send
+        their pids when they start, so every worker is counted, also the ones that replace the exited workers.
+        :return: The 'rss', 'pss', 'shared' and 'private' bytes by the pids of the workers
+        """
+        self._get_pool()
+        while True:
+            try:
+                self._pids.append(self._pids_queue.get_nowait())
+            except queue.Empty:
+                break
+        memories = {pid: _get_memory(pid=pid) for pid in self._pids}
+        self._pids = [pid for pid in self._pids if memories[pid] is not None]
+        return {pid: memories[pid] for pid in self._pids}
+
+    def _get_pool(self):
+        if self._pool is None:
+            raise ValueError(f"The pool is not started")
+        return self._pool
+
+
+def _init_worker(num_threads: int, num_interop_threads: int, pids_queue) -> None:
+    pids_queue.put(os.getpid())
+    if _POOL_MARKUP.cache is not None:
+        _POOL_MARKUP.cache.reopen(commit_every=1)
+    try:
+        import torch
+    except ImportError:
+        return
+    torch.set_num_threads(num_threads)
+    try:
+        torch.set_num_interop_threads(num_interop_threads)
+    except RuntimeError:
+        pass
+
+
+def _mark_up(text: str) -> List[MarkUpBlock]:
+    return _POOL_MARKUP.get_markup(text)
+
+
+def _answer(pair: Tuple[str, str]) -> str:
+    text, question = pair
+    with TextMarkUp._inference_mode():
+        answers = _POOL_QA_MODEL([text], [question])
+    return answers[0][0] if len(answers) > 0 else "Without answer!"
+
+
+def _get_memory(pid: int) -> Dict[str, int] or None:
+    fields = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup", "r") as file:
+            for line in file:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == "kB":
+                    fields[parts[0].rstrip(":")] = int(parts[1]) * 1024
+    except OSError:
+        return None
+    return {"rss": fields.get("Rss", 0),
+            "pss": fields.get("Pss", 0),
+            "shared": fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0),
+            "private": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)}
+
+
+def _get_torch_modules(model) -> List[Any]:
+    if model is None:
+        return []
+    try:
+        import torch
+    except ImportError:
+        return []
+    modules = []
+    for item in getattr(model, "pipe", []):
+        module = getattr(item[-1], "model", None)
+        if isinstance(module, torch.nn.Module):
+            modules.append(module)
+    return modules
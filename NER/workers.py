@@ -0,0 +1,32 @@
+import os
+from typing import Tuple
+
+
+def get_cores_count() -> int:
+    """
+    :return: Count of the cores that this process may run on
+    """
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def get_worker_threads(workers: int, cores: int = None, interop_threads: int = 1) -> Tuple[int, int]:
+    """
+    This function sizes the torch threads of the workers that run on one host, so they do not take more threads than
+    the cores. Every worker gets an equal share of the cores for the intra-op threads, at least one, and the given
+    count of inter-op threads, one is enough for a model that is called by one thread. Pass the result to
+    TextMarkUp(num_threads=..., num_interop_threads=...) in every worker.
+
+    For example 4 workers on 16 cores get 4 intra-op threads each; 32 workers on 16 cores get one thread each and
+    wait for the cores, so it is better to run no more workers than cores.
+    :param workers: Count of the workers on the host
+    :param cores: Count of the cores, by default the cores available to this process
+    :param interop_threads: Count of the inter-op threads of every worker
+    :return: (intra-op threads, inter-op threads) of one worker
+    """
+    if workers <= 0:
+        raise ValueError(f"Workers count should be grater then zero")
+    if cores is None:
+        cores = get_cores_count()
+    return max(1, cores // workers), max(1, interop_threads)
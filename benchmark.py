@@ -0,0 +1,236 @@
+"""
+Benchmark of the TextMarkUp stages on synthetic contracts.
+
+The contracts are made of the paragraphs of doc.txt with requisite lines for the fields used in pattern_stract.json,
+every stage is timed apart and the results are written as json, so they can be compared between versions. The stages
+named 'baseline:' are the separate passes of the requisites, witch get_markup does not use, they are timed to compare
+get_requisites_markup with them.
+
+python benchmark.py --sizes 20000 100000 500000 --density 2 --repeat 3 --stub --output bench.json
+"""
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import statistics
+from NER import *
+
+REQUISITE_LINES = {
+    "IKZ": lambda rnd: f"ИКЗ: {_digits(rnd, 36)}",
+    "INN": lambda rnd: f"ИНН {_digits(rnd, rnd.choice([10, 12]))}",
+    "KPP": lambda rnd: f"КПП {_digits(rnd, 9)}",
+    "OGRN": lambda rnd: f"ОГРН {_digits(rnd, 13)}",
+    "OKPO": lambda rnd: f"ОКПО {_digits(rnd, 8)}",
+    "OKTMO": lambda rnd: f"ОКТМО {_digits(rnd, 9)}",
+    "OKATO": lambda rnd: f"ОКАТО {_digits(rnd, 11)}",
+    "BIC": lambda rnd: f"БИК {_digits(rnd, 9)}",
+    "PHONE": lambda rnd: f"Тел. ({_digits(rnd, 3)}) {_digits(rnd, 3)}-{_digits(rnd, 2)}-{_digits(rnd, 2)};",
+    "SNILS": lambda rnd: f"СНИЛС {_digits(rnd, 3)}-{_digits(rnd, 3)}-{_digits(rnd, 3)} {_digits(rnd, 2)}",
+    "EMAIL": lambda rnd: f"E-mail: user{_digits(rnd, 4)}@mail.ru",
+    "URL": lambda rnd: f"сайт www.zakupki{_digits(rnd, 3)}.ru",
+}
+# The separate passes of the requisites, witch get_requisites_markup replaces, they are timed as the baseline only
+PASSES = ["ikz", "inn", "kpp", "ogrn", "okpo", "oktmo", "okato", "bic", "phone", "snils", "emails", "urls"]
+# Requisites glued to each other, where a requisite of a later pass overlaps an earlier one, the one pass of
+# get_requisites_markup should find the same requisites as the separate passes
+GLUED_REQUISITES = ["тел.: 3422123456КПП 590201001",
+                    "Тел. 8(342)2123456ОГРН 1025900000000 ",
+                    "БИК 1234567890инн 123456789012",
+                    "кпп2876161452икз574408310449030777556623906190130065"
+                    "ИНН1038364744mail:x.y@site.com055567662"]
+
+
+class StubNER:
+    """
+    A stand-in for the DeepPavlov model: splits the texts into words and tags every word as unmarked.
+    """
+
+    def __call__(self, texts):
+        tokens = [re.findall(r"\w+|[^\w\s]", text) for text in texts]
+        return tokens, [["O"] * len(text_tokens) for text_tokens in tokens]
+
+
+def _digits(rnd: random.Random, count: int) -> str:
+    return "".join(rnd.choice("0123456789") for _ in range(count))
+
+
+def load_json(path: str) -> json:
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def pattern_fields(pattern: json, path: tuple = ()) -> list:
+    if "tag" in pattern and isinstance(pattern["tag"], str):
+        return [(path, pattern)]
+    fields = []
+    for key, value in pattern.items():
+        if isinstance(value, dict):
+            fields += pattern_fields(value, path + (key,))
+    return fields
+
+
+def make_contract(source: str, size: int, density: float, tags: list, rnd: random.Random) -> (str, int):
+    """
+    Makes a contract of about 'size' characters with 'density' requisite lines per 1000 characters on average.
+    """
+    paragraphs = [paragraph for paragraph in source.split("\n") if len(paragraph.strip()) > 0]
+    parts = []
+    length = 0
+    requisites = 0
+    while length < size:
+        paragraph = rnd.choice(paragraphs)
+        parts.append(paragraph)
+        length += len(paragraph) + 1
+        expected = density * len(paragraph) / 1000
+        for _ in range(int(expected) + (rnd.random() < expected - int(expected))):
+            line = REQUISITE_LINES[rnd.choice(tags)](rnd)
+            parts.append(line)
+            length += len(line) + 1
+            requisites += 1
+    return "\n".join(parts), requisites
+
+
+def check_requisites(text_markup: TextMarkUp) -> None:
+    """
+    Checks that get_requisites_markup marks up GLUED_REQUISITES like the separate passes, the ends of the blocks are
+    not compared, the passes count the space added after the text in them.
+    """
+    for text in GLUED_REQUISITES:
+        markups = []
+        for passes in [PASSES, None]:
+            markup = [MarkUpBlock(text=text, block_type=MarkUpType.NOTHING, start=0, end=len(text))]
+            if passes is None:
+                markup = TextMarkUp.get_requisites_markup(text_markup=markup)
+            for name in passes or []:
+                markup = TextMarkUp.rebuild_markup(getattr(text_markup, f"get_{name}_markup")(text_markup=markup))
+            markup = TextMarkUp.rebuild_markup(text_markup=markup, delete_empty=True, join_similar=True)
+            markups.append([(block.text, block.block_type, block.start) for block in markup])
+        if markups[0] != markups[1]:
+            raise ValueError(f"Requisites of {text!r} differ: {markups[0]} by the passes, {markups[1]} by one pass")
+
+
+def run_document(text_markup: TextMarkUp, text: str, pattern: json, example: json, is_bert: bool) -> (dict, dict):
+    times = {}
+    counters = {}
+
+    def timed(name, function, *args, **kwargs):
+        started = time.perf_counter()
+        result = function(*args, **kwargs)
+        times[name] = time.perf_counter() - started
+        if isinstance(result, list):
+            counters[name] = len(result)
+        return result
+
+    if is_bert:
+        sectors = timed("sectoring", lambda: TextMarkUp._get_window_sectors(
+            key=0, text=text, windows=text_markup._get_sector_windows(text=text)))
+        markup = timed("bert", lambda: [block for _, sector_markup in text_markup._get_sectors_markup(sectors=sectors)
+                                        for block in sector_markup])
+        markup = timed("rebuild_markup:bert", TextMarkUp.rebuild_markup, text_markup=markup,
+                       delete_empty=True, join_similar=True)
+    else:
+        markup = [MarkUpBlock(text=text, block_type=MarkUpType.NOTHING, start=0, end=len(text))]
+    passes_markup = markup
+    for name in PASSES:
+        passes_markup = timed(f"baseline:get_{name}_markup", getattr(text_markup, f"get_{name}_markup"),
+                              text_markup=passes_markup)
+        passes_markup = timed(f"baseline:rebuild_markup:{name}", TextMarkUp.rebuild_markup, text_markup=passes_markup)
+    markup = timed("get_requisites_markup", TextMarkUp.get_requisites_markup, text_markup=markup)
+    markup = timed("rebuild_markup:final", TextMarkUp.rebuild_markup, text_markup=markup,
+                   delete_empty=True, join_similar=True)
+    sections = timed("template:sections", SectionIndex, text)
+    counters["template:sections"] = len(sections)
+    template = timed("template:compile", TemplateFiller.compile, pattern=pattern)
+    timed("template:fill", template.fill, text_markup=markup, example=example, sections=sections)
+    counters["template:fill"] = len(template.match(text_markup=markup, sections=sections))
+    return times, counters
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark of the TextMarkUp stages on synthetic contracts.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[20000, 100000], help="Sizes of contracts in chars")
+    parser.add_argument("--density", type=float, default=2.0, help="Requisite lines per 1000 chars")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs of every contract")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-bert", action="store_true", help="Mark up without the model")
+    parser.add_argument("--stub", action="store_true", help="Use a stub instead of the model, runs offline")
+    parser.add_argument("--pro-bert", action="store_true", help="Use ner_ontonotes_bert_mult")
+    parser.add_argument("--backend", default="torch", help="Backend of the model: torch, onnx or onnx-int8")
+    parser.add_argument("--parity", action="store_true",
+                        help="Check the markup of the backend and the chunker against torch and the default chunker")
+    parser.add_argument("--min-parity", type=float, default=None,
+                        help="The least share of the same blocks for --parity, by default the markups must be the same "
+                             "except with onnx-int8, the stub is not checked")
+    parser.add_argument("--border", type=int, default=200, help="Tokens in one sector, 0 for no limit but subwords")
+    parser.add_argument("--overlap", type=int, default=0, help="Tokens of context on every side of a sector")
+    parser.add_argument("--sentences", action="store_true", help="Cut the sectors at the ends of sentences")
+    parser.add_argument("--batch-tokens", type=int, default=None,
+                        help="Padded subwords in one model call, packs the sectors by length")
+    parser.add_argument("--max-subwords", type=int, default=None, help="Subword limit of the model, for example 512")
+    parser.add_argument("--source", default="doc.txt")
+    parser.add_argument("--pattern", default="pattern_stract.json")
+    parser.add_argument("--example", default="example_struct.json")
+    parser.add_argument("--output", default=None, help="Path of the json with results, stdout by default")
+    args = parser.parse_args()
+
+    with open(args.source, 'r', encoding='utf-8') as file:
+        source = file.read()
+    pattern = load_json(path=args.pattern)
+    example = load_json(path=args.example)
+    tags = sorted({field["tag"] for _, field in pattern_fields(pattern)
+                   if field["status"] == "used" and field["tag"] in REQUISITE_LINES})
+    is_bert = not args.no_bert
+    chunker = SectorChunker(border=args.border or None, overlap=args.overlap, sentences=args.sentences,
+                            max_subwords=args.max_subwords,
+                            subword_tokenize=str.split if args.stub else None)
+    text_markup = TextMarkUp(is_bert=is_bert, is_pro_bert=args.pro_bert, progress=False, backend=args.backend,
+                             batch_tokens=args.batch_tokens, chunker=chunker)
+    reference = TextMarkUp(is_bert=is_bert, is_pro_bert=args.pro_bert, progress=False) if args.parity else None
+    if is_bert and args.stub:
+        text_markup.ner_model = StubNER()
+        if reference is not None:
+            reference.ner_model = StubNER()
+
+    check_requisites(text_markup=text_markup)
+    rnd = random.Random(args.seed)
+    results = []
+    for size in args.sizes:
+        text, requisites = make_contract(source=source, size=size, density=args.density, tags=tags, rnd=rnd)
+        runs = []
+        for _ in range(args.repeat):
+            times, counters = run_document(text_markup=text_markup, text=text, pattern=pattern, example=example,
+                                           is_bert=is_bert)
+            runs.append(times)
+        results.append({"size": size,
+                        "chars": len(text),
+                        "requisites": requisites,
+                        "counters": counters,
+                        "stages": {name: {"min": min(run[name] for run in runs),
+                                          "median": statistics.median(run[name] for run in runs)}
+                                   for name in runs[0]}})
+        if reference is not None:
+            results[-1]["parity"] = check_parity(reference=reference, candidate=text_markup, texts=[text],
+                                                 min_same_blocks=0.0 if args.stub else args.min_parity, skip=False)
+    report = {"settings": {"density": args.density,
+                           "repeat": args.repeat,
+                           "seed": args.seed,
+                           "model": "none" if not is_bert else "stub" if args.stub else
+                           "ner_ontonotes_bert_mult" if args.pro_bert else "ner_rus_bert",
+                           "backend": args.backend,
+                           "min_parity": args.min_parity if args.parity and not args.stub else None,
+                           "batch_tokens": args.batch_tokens,
+                           "chunker": {"border": args.border, "overlap": args.overlap, "sentences": args.sentences,
+                                       "max_subwords": args.max_subwords},
+                           "tags": tags},
+              "results": results}
+    if args.output is None:
+        json.dump(report, sys.stdout, indent=4, ensure_ascii=False)
+    else:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=4, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,26 +1,103 @@
+import re
+import hashlib
+from collections import OrderedDict
 from NER import *
 from deeppavlov import build_model, configs
 
 # with open('doc.txt', 'r', encoding='utf-8') as file:
 #     context_ru = file.read()
 
+_RE_SPACES = re.compile(r"[\n ]+")
+
+
 class TextProcessor:
-    def __init__(self, is_bert=True, is_pro_bert=True, download=True):
+    def __init__(self, is_bert=True, is_pro_bert=True, download=True, cache_size=1024, top_k=None,
+                 passage_size=1000):
+        """
+        :param cache_size: Count of the cached answers
+        :param top_k: Count of the passages of the text that are given to the model with a question, by default
+         the whole text is given
+        :param passage_size: Count of chars in one passage
+        """
+        if cache_size <= 0:
+            raise ValueError(f"Cache size should be grater then zero")
         self._text_markup = TextMarkUp(is_bert=is_bert, is_pro_bert=is_pro_bert, download=download)
         self._model_qa_ml = build_model(configs.squad.squad_ru_bert, download=download)
+        self._last_source = None
         self._last_text = ""
+        self._last_key = TextProcessor._get_key(text="")
+        self._answers = OrderedDict()
+        self._cache_size = cache_size
+        self._top_k = top_k
+        self._passage_size = passage_size
+        self._passage_index = None
+        self._is_boosted = False
 
     def QA(self, question: str, text: str = None, markup: bool = False) -> List[str]:
-        if text is not None and text != self._last_text:
-            while '\n' in text or '  ' in text:
-                text = text.replace("\n", " ").replace("  ", " ")
-            self._last_text = text
-        answer = self._model_qa_ml([self._last_text], [question])
-        answer = answer[0][0] if len(answer) > 0 else "Without answer!"
+        return self.QA_many(questions=[question], text=text, markup=markup)[0]
+
+    def QA_many(self,
+                questions: List[str],
+                text: str = None,
+                markup: bool = False,
+                text_markup: List[MarkUpBlock] = None) -> List[Tuple[str, list]]:
+        """
+        :ru Этот метод отвечает на несколько вопросов по одному тексту за один вызов модели.
+        :en This method answers several questions about one text in one call of the model.
+
+        The answers are cached by the hash of the text and the question, only the questions without a cached
+        answer are sent to the model. The text is kept for the next calls without a text, like QA does. When top_k
+        is set, only the passages of the text found by PassageIndex for a question are given to the model with it.
+        :param questions: The questions about the text
+        :param text: The text, by default the last given one
+        :param markup: Whether to mark up the answers
+        :param text_markup: Markup of the text, the passages with blocks of the asked types are found first
+        :return: List of pairs (answer, markup of the answer) in the order of the questions
+        """
+        if text is not None and text != self._last_source:
+            self._last_source = text
+            self._last_text = _RE_SPACES.sub(" ", text)
+            self._last_key = TextProcessor._get_key(text=self._last_text)
+            self._passage_index = None
+            self._is_boosted = False
+        if self._top_k is not None and (self._passage_index is None or text_markup is not None):
+            self._passage_index = PassageIndex(text=self._last_source if self._last_source is not None else "",
+                                               tokenize=self._text_markup.tokenizer.tokenize,
+                                               passage_size=self._passage_size, text_markup=text_markup)
+            self._is_boosted = text_markup is not None
+        answers = {}
+        for question in questions:
+            answer = self._answers.get(self._get_answer_key(question=question))
+            if answer is not None:
+                self._answers.move_to_end(self._get_answer_key(question=question))
+                answers[question] = answer
+        missing = [question for question in dict.fromkeys(questions) if question not in answers]
+        if len(missing) > 0:
+            if self._passage_index is not None:
+                contexts = [_RE_SPACES.sub(" ", self._passage_index.get_context(question=question, top_k=self._top_k))
+                            for question in missing]
+            else:
+                contexts = [self._last_text] * len(missing)
+            model_answers = self._model_qa_ml(contexts, missing)
+            for index, question in enumerate(missing):
+                answers[question] = model_answers[0][index] \
+                    if len(model_answers) > 0 and index < len(model_answers[0]) else "Without answer!"
+                self._answers[self._get_answer_key(question=question)] = answers[question]
+            while len(self._answers) > self._cache_size:
+                self._answers.popitem(last=False)
+        answers = [answers[question] for question in questions]
         if markup:
-            return answer, [block.to_json() for block in self._text_markup.get_markup(text=answer)]
+            return [(answer, [block.to_json() for block in answer_markup]) for answer, answer_markup in
+                    zip(answers, self._text_markup.get_markup_many(texts=answers, workers=0))]
         # .replace("\n", " ").replace("  ", " ")
-        return answer, [answer]
+        return [(answer, [answer]) for answer in answers]
+
+    def _get_answer_key(self, question: str) -> Tuple[str, int, bool, str]:
+        return self._last_key, self._top_k or 0, self._is_boosted, question
+
+    @staticmethod
+    def _get_key(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
 
 
 def read_txt(path: str) -> str:
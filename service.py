@@ -0,0 +1,46 @@
+"""
+Markup service: serves TextMarkUp and the QA model to many concurrent callers over HTTP with one model instance.
+
+python service.py --port 8080 --pro-bert --qa
+curl -s -X POST localhost:8080/markup -d '{"text": "ИНН 5902835222"}'
+curl -s -X POST localhost:8080/qa -d '{"text": "...", "questions": ["Какая цена договора?"]}'
+curl -s localhost:8080/metrics
+"""
+import asyncio
+import argparse
+from NER import *
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Markup service with micro-batching of the model calls.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--unix", default=None, help="Path of a Unix socket, used instead of the port")
+    parser.add_argument("--no-bert", action="store_true", help="Mark up without the model")
+    parser.add_argument("--pro-bert", action="store_true", help="Use ner_ontonotes_bert_mult")
+    parser.add_argument("--backend", default="torch", help="Backend of the model: torch, onnx or onnx-int8")
+    parser.add_argument("--download", action="store_true", help="Download the models")
+    parser.add_argument("--qa", action="store_true", help="Serve the squad_ru_bert model on /qa")
+    parser.add_argument("--threads", type=int, default=None, help="Intra-op threads of the model")
+    parser.add_argument("--max-batch", type=int, default=16, help="Sectors or questions in one model call")
+    parser.add_argument("--max-delay", type=float, default=0.01, help="Longest wait for a batch in seconds")
+    parser.add_argument("--max-queue", type=int, default=1024, help="Waiting sectors or questions before 503")
+    args = parser.parse_args()
+
+    text_markup = TextMarkUp(is_bert=not args.no_bert, is_pro_bert=args.pro_bert, download=args.download,
+                             batch_size=args.max_batch, progress=False, backend=args.backend,
+                             num_threads=args.threads).load()
+    qa_model = None
+    if args.qa:
+        from deeppavlov import build_model, configs
+        qa_model = build_model(configs.squad.squad_ru_bert, download=args.download)
+    service = MarkUpService(text_markup=text_markup, qa_model=qa_model, max_batch=args.max_batch,
+                            max_delay=args.max_delay, max_queue=args.max_queue)
+    try:
+        asyncio.run(service.serve(host=args.host, port=args.port, path=args.unix))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()